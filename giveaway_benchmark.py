@@ -0,0 +1,211 @@
+"""Giveaway load test and draw benchmark.
+
+Runs GiveawayView.join_giveaway against fake interactions for several concurrent
+giveaways, then draws and rerolls them, and reports join throughput, latency,
+peak memory and bytes written. Runs in a temporary directory so live data is untouched.
+
+    python giveaway_benchmark.py --entrants 10000 --giveaways 3
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# --------- Fake Discord Objects -----------
+
+class FakeRole:
+    def __init__(self, role_id: int):
+        self.id = role_id
+        self.name = f"role-{role_id}"
+
+class FakeMember:
+    def __init__(self, member_id: int, roles: list):
+        self.id = member_id
+        self.roles = roles
+        self.mention = f"<@{member_id}>"
+        self.display_name = f"member-{member_id}"
+
+class FakeMessage:
+    def __init__(self, message_id: int):
+        self.id = message_id
+
+class FakeResponse:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, content=None, **kwargs):
+        self.messages.append(content)
+
+class FakeInteraction:
+    def __init__(self, user: FakeMember, message: FakeMessage):
+        self.user = user
+        self.message = message
+        self.response = FakeResponse()
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.mention = f"<#{channel_id}>"
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+class FakeGuild:
+    def __init__(self, guild_id: int, members: dict, channel: FakeChannel):
+        self.id = guild_id
+        self.members = members
+        self.channel = channel
+
+    def get_member(self, member_id: int):
+        return self.members.get(member_id)
+
+    def get_channel(self, channel_id: int):
+        return self.channel if channel_id == self.channel.id else None
+
+# --------- Instrumentation -----------
+
+class WriteCounter:
+    """Wraps main's persistence helpers to count the bytes they put on disk"""
+
+    def __init__(self, main):
+        self.bytes_written = 0
+        self.writes = 0
+        save_json, append_jsonl = main.save_json, main.append_jsonl
+
+        def counted_save_json(file_name, data):
+            save_json(file_name, data)
+            self.writes += 1
+            self.bytes_written += os.path.getsize(file_name)
+
+        def counted_append_jsonl(file_name, records):
+            size = os.path.getsize(file_name) if os.path.isfile(file_name) else 0
+            append_jsonl(file_name, records)
+            self.writes += 1
+            self.bytes_written += os.path.getsize(file_name) - size
+
+        main.save_json = counted_save_json
+        main.append_jsonl = counted_append_jsonl
+
+    def take(self):
+        result = (self.writes, self.bytes_written)
+        self.writes = self.bytes_written = 0
+        return result
+
+def percentile(sorted_values: list, fraction: float):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def format_bytes(size: int):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+# --------- Benchmark -----------
+
+async def run(args):
+    import main  # Imported after chdir so it loads and writes data in the temp directory
+
+    counter = WriteCounter(main)
+    rng = random.Random(args.seed)
+    role_pool = [FakeRole(1000 + i) for i in range(20)]
+    channel = FakeChannel(500)
+
+    # Members with a random spread of roles and XP
+    members = {}
+    for index in range(args.entrants):
+        member_id = 10**17 + index
+        members[member_id] = FakeMember(member_id, rng.sample(role_pool, rng.randint(0, 4)))
+        main.member_stats[str(member_id)] = {"xp": rng.randint(0, 5000), "all_time_messages": rng.randint(0, 500)}
+    guild = FakeGuild(main.GUILD_ID, members, channel)
+
+    # Active giveaways with a level requirement, bypass role and extra entry roles
+    message_ids = []
+    for index in range(args.giveaways):
+        giveaway_id = f"bench{index}"
+        message_id = 9 * 10**17 + index
+        main.giveaways_data[giveaway_id] = {
+            "id": giveaway_id, "name": f"Benchmark {index}", "prizes": "Nothing", "host_id": 1,
+            "channel_id": channel.id, "winners": args.winners, "end_time": int(time.time()) + 3600,
+            "status": "active", "message_id": message_id, "role_restricted": False,
+            "required_roles": [], "bypass_roles": [role_pool[0].id], "required_level": 2,
+            "required_messages": {"type": "all_time", "amount": 10, "days": None},
+            "extra_entry_roles": [{"role_id": role_pool[1].id, "entries": 3}, {"role_id": role_pool[2].id, "entries": 2}],
+            "claims": {}, "claim_deadline": None,
+        }
+        main.giveaway_message_index[message_id] = giveaway_id
+        message_ids.append(message_id)
+    counter.take()
+
+    view = main.GiveawayView()
+    clicks = [(member, message_id) for member in members.values() for message_id in message_ids]
+    rng.shuffle(clicks)
+
+    tracemalloc.start()
+    latencies = []
+    started = time.perf_counter()
+    for index, (member, message_id) in enumerate(clicks, 1):
+        interaction = FakeInteraction(member, FakeMessage(message_id))
+        click_start = time.perf_counter()
+        await main.GiveawayView.join_giveaway(view, interaction, None)
+        latencies.append(time.perf_counter() - click_start)
+        # Stand-in for the periodic flush_giveaway_joins task
+        if index % args.flush_every == 0:
+            main.giveaway_participants.flush()
+    main.giveaway_participants.flush()
+    join_seconds = time.perf_counter() - started
+    join_writes, join_bytes = counter.take()
+    _, join_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+
+    latencies.sort()
+    joined = sum(len(main.giveaway_participants.get(f"bench{index}")) for index in range(args.giveaways))
+    print(f"Joins:        {len(clicks)} clicks, {joined} accepted across {args.giveaways} giveaways")
+    print(f"Throughput:   {len(clicks) / join_seconds:,.0f} joins/sec")
+    print(f"Latency:      p50 {percentile(latencies, 0.50) * 1e6:.1f} µs, p99 {percentile(latencies, 0.99) * 1e6:.1f} µs, max {latencies[-1] * 1e6:.1f} µs")
+    print(f"Join writes:  {join_writes} writes, {format_bytes(join_bytes)}")
+    print(f"Join memory:  {format_bytes(join_peak)} peak")
+
+    # Draws, then full and single-winner rerolls
+    for label, kwargs in (("Draw", {}), ("Reroll all", {"reroll": True}), ("Reroll one", {"reroll": True, "specific": True})):
+        timings = []
+        replayed = 0
+        for index in range(args.giveaways):
+            giveaway_id = f"bench{index}"
+            specific_members = main.giveaways_data[giveaway_id].get("winners_list", [])[:1] if kwargs.get("specific") else None
+            draw_start = time.perf_counter()
+            await main.end_giveaway(giveaway_id, guild, reroll=kwargs.get("reroll", False), specific_members=specific_members, seed=args.seed + index)
+            timings.append(time.perf_counter() - draw_start)
+            # The logged inputs must reproduce the winners this draw added
+            draw = main.giveaways_data[giveaway_id]["draws"][-1]
+            picks = main.replay_giveaway_draw(giveaway_id, draw)
+            replayed += picks is not None and picks == draw["winners"][len(draw["winners"]) - len(picks):]
+        writes, written = counter.take()
+        print(f"{label + ':':<13} mean {sum(timings) / len(timings) * 1e3:.2f} ms, max {max(timings) * 1e3:.2f} ms, {writes} writes, {format_bytes(written)}, {replayed}/{args.giveaways} replayed")
+    _, draw_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Draw memory:  {format_bytes(draw_peak)} peak")
+
+def main_entry():
+    parser = argparse.ArgumentParser(description="Giveaway load test and draw benchmark")
+    parser.add_argument("--entrants", type=int, default=10000, help="Members clicking join on every giveaway")
+    parser.add_argument("--giveaways", type=int, default=3, help="Concurrent active giveaways")
+    parser.add_argument("--winners", type=int, default=5, help="Winners per giveaway")
+    parser.add_argument("--flush-every", type=int, default=1000, help="Joins between participant log flushes")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the synthetic members and draws")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main_entry()
@@ -6,13 +6,21 @@ import json
 import os
 import math
 import asyncio
+import heapq
+import time
+import re
+import base64
+import hashlib
+import itertools
+import contextlib
+import weakref
+import bisect
+import random
+import secrets
+from array import array
 
 # --------- Config -----------
 TOKEN = os.getenv("DISCORD_BOT_TOKEN")
-if not TOKEN:
-    print("Error: DISCORD_BOT_TOKEN environment variable not set!")
-    print("Please set your Discord bot token in the Secrets tab.")
-    exit(1)
 GUILD_ID = 1362531923586453678  # Your guild ID here
 TIER_CHANNEL_ID = 1362836497060855959  # Tier list channel ID
 
@@ -42,6 +50,45 @@ STAFF_ROLES = [
 # Default embed color
 DEFAULT_EMBED_COLOR = 0x680da8
 
+# Number of days of per-user message history kept for rolling windows
+ACTIVITY_HISTORY_DAYS = 90
+
+# HyperLogLog precision for active-user sketches (2^p one-byte registers, ~1.04/sqrt(2^p) error)
+HLL_PRECISION = 10
+
+# Trending terms: Count-Min Sketch size, heavy-hitter candidates and per-message token cap
+TRENDING_SKETCH_WIDTH = 2048
+TRENDING_SKETCH_DEPTH = 4
+TRENDING_TOP_K = 50
+TRENDING_MAX_TOKENS = 32
+
+# Maximum number of scheduled jobs (giveaway ends, reminders) running at once
+SCHEDULER_CONCURRENCY = 8
+
+# Journal entries written before the reminder snapshot is rewritten
+REMINDER_COMPACT_AFTER = 1000
+
+# How often buffered giveaway joins are appended to the participant logs
+GIVEAWAY_LOG_FLUSH_SECONDS = 5
+
+# Most members whose role sets are cached for giveaway checks, least recently used are evicted
+MEMBER_ROLE_CACHE_SIZE = 20000
+
+# Minimum seconds between edits of an auction thread's pinned bid summary
+AUCTION_SUMMARY_EDIT_SECONDS = 5
+
+# How long a proposed trade stays open before its escrow is returned
+TRADE_EXPIRY_MINUTES = 15
+
+# Items shown per page of the shop catalog
+SHOP_PAGE_SIZE = 10
+
+# Discord rejects embeds whose title, description, fields and footer exceed this many characters in total
+EMBED_TOTAL_LIMIT = 6000
+
+# How often in-memory analytics stores are flushed to disk
+ANALYTICS_FLUSH_MINUTES = 5
+
 # Tier colors for embeds
 TIER_COLORS = {
     "s": 0xFFD700,  # Gold
@@ -73,7 +120,6 @@ def load_json(file_name):
 tier_data = load_json("tierlist.json")
 member_stats = load_json("member_stats.json")
 shops_data = load_json("shops.json")  # Multiple shops
-user_balances = load_json("balances.json")
 user_inventories = load_json("inventories.json")  # User inventories
 reaction_roles = load_json("reaction_roles.json")
 sticky_messages = load_json("sticky_messages.json")  # Sticky message tracking
@@ -91,11 +137,29 @@ def save_json(file_name, data):
     with open(file_name, "w") as f:
         json.dump(data, f, indent=2)
 
+def append_jsonl(file_name, records):
+    """Append records to a JSON-lines journal in a single write"""
+    with open(file_name, "a") as f:
+        f.write("".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records))
+
+def load_jsonl(file_name):
+    records = []
+    if os.path.isfile(file_name):
+        with open(file_name, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # Torn write at the end of the journal
+    return records
+
 def save_all():
     save_json("tierlist.json", tier_data)
     save_json("member_stats.json", member_stats)
     save_json("shops.json", shops_data)
-    save_json("balances.json", user_balances)
     save_json("inventories.json", user_inventories)
     save_json("reaction_roles.json", reaction_roles)
     save_json("sticky_messages.json", sticky_messages)
@@ -210,12 +274,17 @@ def build_level_embed(user: discord.User):
     
     return embed
 
-def build_message_embed(user: discord.User, message_type: str):
-    data = member_stats.get(str(user.id), {})
-    messages = data.get(f"{message_type}_messages", 0)
+def build_message_embed(user: discord.User, message_type: str, days: int = None):
+    if days:
+        messages = activity_history.window_sum(str(user.id), days)
+        title = f"{user.display_name}'s Messages (Last {days} Days)"
+    else:
+        data = member_stats.get(str(user.id), {})
+        messages = data.get(f"{message_type}_messages", 0)
+        title = f"{user.display_name}'s {message_type.replace('_', ' ').title()} Messages"
     
     embed = discord.Embed(
-        title=f"{user.display_name}'s {message_type.replace('_', ' ').title()} Messages",
+        title=title,
         color=DEFAULT_EMBED_COLOR,
     )
     embed.set_thumbnail(url=user.avatar.url if user.avatar else user.default_avatar.url)
@@ -284,6 +353,1313 @@ def ensure_user_slots(user_id: str, member: discord.Member = None):
         # Total = role-based slots + manually added slots
         premium_slots[user_id]["total_slots"] = role_slots + premium_slots[user_id].get("manual_slots", 0)
 
+# --------- Catalog -----------
+
+def normalize_key(name: str):
+    return name.lower().replace(" ", "_")
+
+def get_final_price(item_info: dict):
+    return item_info["price"] * (100 - item_info.get("discount", 0)) // 100
+
+class CatalogRegistry:
+    """Compact integer IDs for shops and items.
+
+    IDs are assigned once and never reused, so inventories can hold items that have
+    since been removed from their shop.
+    """
+
+    def __init__(self, file_name: str = "catalog.json"):
+        self.file_name = file_name
+        data = load_json(file_name)
+        self.next_id = data.get("next_id", 1)
+        self.shop_ids = data.get("shops", {})  # shop_key -> shop_id
+        self.shop_keys = {shop_id: shop_key for shop_key, shop_id in self.shop_ids.items()}
+        self.items = {int(item_id): tuple(keys) for item_id, keys in data.get("items", {}).items()}  # item_id -> (shop_key, item_key)
+        self.item_ids = {keys: item_id for item_id, keys in self.items.items()}
+
+    def save(self):
+        save_json(self.file_name, {"next_id": self.next_id, "shops": self.shop_ids, "items": self.items})
+
+    def _new_id(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    def register_shop(self, shop_key: str):
+        if shop_key not in self.shop_ids:
+            self.shop_ids[shop_key] = self._new_id()
+            self.shop_keys[self.shop_ids[shop_key]] = shop_key
+        return self.shop_ids[shop_key]
+
+    def register_item(self, shop_key: str, item_key: str):
+        item_id = self.item_ids.get((shop_key, item_key))
+        if item_id is None:
+            self.register_shop(shop_key)
+            item_id = self._new_id()
+            self.items[item_id] = (shop_key, item_key)
+            self.item_ids[(shop_key, item_key)] = item_id
+        return item_id
+
+    def shop_key(self, shop_id: int):
+        return self.shop_keys.get(shop_id)
+
+    def item_info(self, item_id: int):
+        """Return (shop_info, item_info) for an item ID, or (None, None) if it no longer exists"""
+        shop_key, item_key = self.items.get(item_id, (None, None))
+        shop_info = shops_data.get(shop_key)
+        if not shop_info or item_key not in shop_info["items"]:
+            return None, None
+        return shop_info, shop_info["items"][item_key]
+
+catalog = CatalogRegistry()
+
+# Register any shops and items created before the catalog existed
+catalog_size = catalog.next_id
+for shop_key, shop_info in shops_data.items():
+    catalog.register_shop(shop_key)
+    for item_key in shop_info["items"]:
+        catalog.register_item(shop_key, item_key)
+
+# Inventories are {user_id: {item_id: quantity}}, convert the old {shop_key: {item_key: quantity}} layout
+inventories_converted = False
+for user_id, inventory in user_inventories.items():
+    converted = {}
+    for key, value in inventory.items():
+        if isinstance(value, dict):
+            inventories_converted = True
+            for item_key, quantity in value.items():
+                if quantity:
+                    converted[catalog.register_item(key, item_key)] = quantity
+        else:
+            converted[int(key)] = value
+    user_inventories[user_id] = converted
+
+if catalog.next_id != catalog_size:
+    catalog.save()
+if inventories_converted:
+    save_json("inventories.json", user_inventories)
+
+# Reverse index: item_id -> set of user IDs holding it, kept in sync by the inventory helpers
+item_holder_index = {}
+for user_id, inventory in user_inventories.items():
+    for item_id in inventory:
+        item_holder_index.setdefault(item_id, set()).add(user_id)
+
+def inventory_qty(user_id: str, item_id: int):
+    return user_inventories.get(user_id, {}).get(item_id, 0)
+
+def inventory_add(user_id: str, item_id: int, quantity: int = 1):
+    inventory = user_inventories.setdefault(user_id, {})
+    inventory[item_id] = inventory.get(item_id, 0) + quantity
+    item_holder_index.setdefault(item_id, set()).add(user_id)
+    net_worth.inventory_changed(user_id, item_id, quantity)
+
+def inventory_remove(user_id: str, item_id: int, quantity: int = 1):
+    """Take items from a user's inventory, returns False without changes if they don't have enough"""
+    inventory = user_inventories.get(user_id, {})
+    held = inventory.get(item_id, 0)
+    if held < quantity:
+        return False
+    if held == quantity:
+        del inventory[item_id]
+        holders = item_holder_index.get(item_id)
+        holders.discard(user_id)
+        if not holders:
+            del item_holder_index[item_id]
+    else:
+        inventory[item_id] = held - quantity
+    net_worth.inventory_changed(user_id, item_id, -quantity)
+    return True
+
+# --------- Auction Indexes -----------
+
+AUCTION_INDEX_FIELDS = ("status", "seller_id", "rarity", "type_category", "server")
+
+class AuctionLookup:
+    """Secondary indexes over auction_data: field -> value -> set of auction IDs"""
+
+    def __init__(self):
+        self.indexes = {field: {} for field in AUCTION_INDEX_FIELDS}
+        self.values = {}  # auction_id -> indexed values, so entries can be removed after the record changes
+
+    def add(self, auction_id: str):
+        auction = auction_data[auction_id]
+        values = tuple(auction.get(field) for field in AUCTION_INDEX_FIELDS)
+        self.remove(auction_id)
+        for field, value in zip(AUCTION_INDEX_FIELDS, values):
+            self.indexes[field].setdefault(value, set()).add(auction_id)
+        self.values[auction_id] = values
+
+    def remove(self, auction_id: str):
+        values = self.values.pop(auction_id, None)
+        if values is None:
+            return
+        for field, value in zip(AUCTION_INDEX_FIELDS, values):
+            bucket = self.indexes[field].get(value)
+            if bucket is not None:
+                bucket.discard(auction_id)
+                if not bucket:
+                    del self.indexes[field][value]
+
+    def query(self, **filters):
+        """Auction IDs matching every given field (None means any), newest first"""
+        buckets = [self.indexes[field].get(value, set()) for field, value in filters.items() if value is not None]
+        if not buckets:
+            matches = self.values.keys()
+        else:
+            buckets.sort(key=len)
+            matches = [auction_id for auction_id in buckets[0] if all(auction_id in bucket for bucket in buckets[1:])]
+        return sorted(matches, key=int, reverse=True)
+
+auction_lookup = AuctionLookup()
+
+def set_auction_status(auction_id: str, status: str):
+    """Move an auction to a new status, releasing its premium slot when it stops being active"""
+    auction = auction_data[auction_id]
+    was_active = auction["status"] == "active"
+    auction["status"] = status
+    auction_lookup.add(auction_id)
+    auction_summary_pending.add(auction_id)
+    
+    if was_active and status != "active" and auction.get("is_premium"):
+        seller_id = str(auction["seller_id"])
+        if seller_id in premium_slots and premium_slots[seller_id]["used_slots"] > 0:
+            premium_slots[seller_id]["used_slots"] -= 1
+
+def delete_auction(auction_id: str):
+    del auction_data[auction_id]
+    auction_index.remove(auction_id)
+    auction_lookup.remove(auction_id)
+
+# --------- Autocomplete -----------
+
+class AutocompleteIndex:
+    """Prefix trie over search terms plus a recency order for autocomplete suggestions.
+
+    Every word of an entry's name is indexed, so "gem" finds "Red Gem". Matches are
+    ranked by how recently the entry was created or used.
+    """
+
+    def __init__(self):
+        self.root = {}  # char -> child node, "" -> set of keys ending here
+        self.entries = {}  # key -> (choice name, choice value, terms)
+        self.recent = {}  # key -> tick, dict order is least to most recently used
+        self.tick = 0
+
+    def add(self, key, name: str, value: str, text: str):
+        self.remove(key)
+        words = text.lower().split()
+        terms = {" ".join(words[index:]) for index in range(len(words))}
+        for term in terms:
+            node = self.root
+            for char in term:
+                node = node.setdefault(char, {})
+            node.setdefault("", set()).add(key)
+        self.entries[key] = (name[:100], value[:100], terms)
+        self.touch(key)
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.recent.pop(key, None)
+        for term in entry[2]:
+            path = [self.root]
+            for char in term:
+                path.append(path[-1][char])
+            path[-1][""].discard(key)
+            # Prune nodes left empty
+            for depth in range(len(term), 0, -1):
+                node = path[depth]
+                if node.get("") or len(node) > ("" in node):
+                    break
+                del path[depth - 1][term[depth - 1]]
+
+    def touch(self, key):
+        if key in self.entries:
+            self.recent.pop(key, None)
+            self.tick += 1
+            self.recent[key] = self.tick
+
+    def search(self, prefix: str, predicate=None, limit: int = 25):
+        """Return app_commands choices for entries matching the prefix, most recent first"""
+        prefix = prefix.lower().strip()
+        if not prefix:
+            # Every entry matches, walk newest first and stop once the limit qualifies
+            keys = (key for key in reversed(self.recent) if predicate is None or predicate(key))
+            keys = itertools.islice(keys, limit)
+        else:
+            node = self.root
+            for char in prefix:
+                node = node.get(char)
+                if node is None:
+                    return []
+            # Only entries under the prefix node are candidates, filtered before ranking
+            found = set()
+            stack = [node]
+            while stack:
+                node = stack.pop()
+                found.update(node.get("", ()))
+                stack.extend(child for char, child in node.items() if char)
+            if predicate is not None:
+                found = filter(predicate, found)
+            keys = heapq.nlargest(limit, found, key=self.recent.get)
+        
+        return [app_commands.Choice(name=self.entries[key][0], value=self.entries[key][1]) for key in keys]
+
+shop_index = AutocompleteIndex()
+item_indexes = {}  # shop_key -> AutocompleteIndex of that shop's items
+auction_index = AutocompleteIndex()
+giveaway_index = AutocompleteIndex()
+role_menu_index = AutocompleteIndex()
+
+def index_shop_item(shop_key: str, item_key: str):
+    item_name = shops_data[shop_key]["items"][item_key]["name"]
+    item_indexes.setdefault(shop_key, AutocompleteIndex()).add(item_key, item_name, item_name, item_name)
+
+def index_auction(auction_id: str):
+    auction = auction_data[auction_id]
+    auction_index.add(auction_id, f"{auction['name']} ({auction_id})", auction_id, f"{auction['name']} {auction_id}")
+    auction_lookup.add(auction_id)
+
+def index_giveaway(giveaway_id: str):
+    giveaway = giveaways_data[giveaway_id]
+    giveaway_index.add(giveaway_id, f"{giveaway['name']} ({giveaway_id[:8]})", giveaway_id, f"{giveaway['name']} {giveaway_id}")
+
+def index_role_menu(menu_id: str):
+    menu = server_settings["role_menus"][menu_id]
+    role_menu_index.add(menu_id, f"{menu['title']} ({menu_id[:8]})", menu_id, f"{menu['title']} {menu_id}")
+
+for shop_key, shop_info in shops_data.items():
+    shop_index.add(shop_key, shop_info["name"], shop_info["name"], shop_info["name"])
+    for item_key in shop_info["items"]:
+        index_shop_item(shop_key, item_key)
+for auction_id in auction_data:
+    index_auction(auction_id)
+for giveaway_id in giveaways_data:
+    index_giveaway(giveaway_id)
+for menu_id in server_settings.get("role_menus", {}):
+    index_role_menu(menu_id)
+
+async def shop_autocomplete(interaction: discord.Interaction, current: str):
+    return shop_index.search(current)
+
+def item_autocomplete(shop_param: str):
+    """Autocomplete items of the shop typed into another option of the same command"""
+    async def autocomplete(interaction: discord.Interaction, current: str):
+        shop_name = getattr(interaction.namespace, shop_param, None)
+        index = item_indexes.get(normalize_key(shop_name)) if shop_name else None
+        return index.search(current) if index else []
+    return autocomplete
+
+async def active_auction_autocomplete(interaction: discord.Interaction, current: str):
+    return auction_index.search(current, lambda auction_id: auction_data[auction_id]["status"] == "active")
+
+async def auction_autocomplete(interaction: discord.Interaction, current: str):
+    return auction_index.search(current)
+
+async def open_giveaway_autocomplete(interaction: discord.Interaction, current: str):
+    return giveaway_index.search(current, lambda giveaway_id: giveaways_data[giveaway_id]["status"] != "ended")
+
+async def giveaway_autocomplete(interaction: discord.Interaction, current: str):
+    return giveaway_index.search(current)
+
+async def role_menu_autocomplete(interaction: discord.Interaction, current: str):
+    return role_menu_index.search(current)
+
+# --------- Ledger -----------
+
+class Ledger:
+    """Append-only currency ledger with balances kept as an in-memory view.
+
+    Every balance change is one line in ledger.jsonl (id, ts, uid, delta, reason, ref).
+    The balances view is snapshotted periodically together with the byte offset it
+    covers, so startup only replays the entries written since the last snapshot.
+    """
+
+    def __init__(self, ledger_file: str = "ledger.jsonl", snapshot_file: str = "ledger_snapshot.json"):
+        self.ledger_file = ledger_file
+        self.snapshot_file = snapshot_file
+        snapshot = load_json(snapshot_file)
+        ledger_size = os.path.getsize(ledger_file) if os.path.isfile(ledger_file) else 0
+        if snapshot.get("offset", 0) > ledger_size:
+            snapshot = {}  # Snapshot is newer than the ledger, rebuild from scratch
+        self.balances = snapshot.get("balances", {})  # user_id -> balance
+        self.last_id = snapshot.get("last_id", 0)
+        self.snapshot_id = self.last_id
+        self.size = snapshot.get("offset", 0)
+        self.offsets = None  # user_id -> array of line offsets, built on the first history lookup
+        self.on_change = None  # Called with each user ID whose balance changed
+        
+        if ledger_size:
+            with open(ledger_file, "rb+") as f:
+                f.seek(self.size)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Torn write at the end of the ledger
+                    self._apply(json.loads(line))
+                    self.size += len(line)
+                f.truncate(self.size)
+
+    def _apply(self, entry: dict):
+        self.balances[entry["uid"]] = self.balances.get(entry["uid"], 0) + entry["delta"]
+        self.last_id = entry["id"]
+
+    def post(self, user_id: str, delta: int, reason: str, ref: str = None):
+        """Record a single balance change and return the ledger entry"""
+        return self.post_many([(user_id, delta, reason, ref)])[0]
+
+    def post_many(self, changes: list):
+        """Record (user_id, delta, reason, ref) changes with one sequential append"""
+        now = int(time.time())
+        entries = []
+        for user_id, delta, reason, ref in changes:
+            entries.append({"id": self.last_id + len(entries) + 1, "ts": now, "uid": user_id, "delta": delta, "reason": reason, "ref": ref})
+        # Encoded up front so offsets are byte counts whatever characters a reason or ref holds
+        lines = [(json.dumps(entry, separators=(",", ":")) + "\n").encode() for entry in entries]
+        with open(self.ledger_file, "ab") as f:
+            f.write(b"".join(lines))
+        
+        for entry, line in zip(entries, lines):
+            self._apply(entry)
+            if self.offsets is not None:
+                self.offsets.setdefault(entry["uid"], array("Q")).append(self.size)
+            self.size += len(line)
+        if self.on_change:
+            for user_id in {entry["uid"] for entry in entries}:
+                self.on_change(user_id)
+        return entries
+
+    def read_from(self, offset: int):
+        """Yield the entries written at or after a byte offset"""
+        if offset >= self.size:
+            return
+        with open(self.ledger_file, "rb") as f:
+            f.seek(offset)
+            while f.tell() < self.size:
+                yield json.loads(f.readline())
+
+    def snapshot(self):
+        if self.last_id != self.snapshot_id:
+            save_json(self.snapshot_file, {"last_id": self.last_id, "offset": self.size, "balances": self.balances})
+            self.snapshot_id = self.last_id
+
+    def _build_offsets(self):
+        self.offsets = {}
+        if not os.path.isfile(self.ledger_file):
+            return
+        position = 0
+        with open(self.ledger_file, "rb") as f:
+            for line in f:
+                if position >= self.size:
+                    break
+                self.offsets.setdefault(json.loads(line)["uid"], array("Q")).append(position)
+                position += len(line)
+
+    def history(self, user_id: str, start: int = 0, limit: int = 10):
+        """Return (entries, total) for a user's transactions, newest first"""
+        if self.offsets is None:
+            self._build_offsets()
+        offsets = self.offsets.get(user_id)
+        if not offsets:
+            return [], 0
+        total = len(offsets)
+        entries = []
+        with open(self.ledger_file, "rb") as f:
+            for index in range(total - 1 - start, max(-1, total - 1 - start - limit), -1):
+                f.seek(offsets[index])
+                entries.append(json.loads(f.readline()))
+        return entries, total
+
+ledger = Ledger()
+user_balances = ledger.balances
+
+# Move balances.json into the ledger as opening balances
+if not ledger.last_id and os.path.isfile("balances.json"):
+    opening_balances = [(user_id, balance, "opening_balance", None) for user_id, balance in load_json("balances.json").items() if balance]
+    if opening_balances:
+        ledger.post_many(opening_balances)
+        ledger.snapshot()
+
+# --------- Net Worth -----------
+
+class NetWorthIndex:
+    """Incrementally maintained net worth (balance + inventory at current shop prices).
+
+    Inventory changes adjust a single user, price changes only touch that item's
+    holders, and a sorted (-net worth, user_id) list serves the leaderboard.
+    """
+
+    def __init__(self):
+        self.item_values = {}  # item_id -> current discounted price, 0 once removed from its shop
+        for item_id in catalog.items:
+            shop_info, item_info = catalog.item_info(item_id)
+            self.item_values[item_id] = get_final_price(item_info) if item_info else 0
+        self.inventory_values = {
+            user_id: sum(self.item_values.get(item_id, 0) * quantity for item_id, quantity in inventory.items())
+            for user_id, inventory in user_inventories.items()
+        }
+        self.worth = {}  # user_id -> net worth as stored in the ranking
+        for user_id in set(user_balances) | set(self.inventory_values):
+            self.worth[user_id] = user_balances.get(user_id, 0) + self.inventory_values.get(user_id, 0)
+        self.ranking = sorted((-worth, user_id) for user_id, worth in self.worth.items())
+
+    def get(self, user_id: str):
+        return self.worth.get(user_id, 0)
+
+    def refresh(self, user_id: str):
+        new_worth = user_balances.get(user_id, 0) + self.inventory_values.get(user_id, 0)
+        old_worth = self.worth.get(user_id)
+        if old_worth == new_worth:
+            return
+        if old_worth is not None:
+            del self.ranking[bisect.bisect_left(self.ranking, (-old_worth, user_id))]
+        self.worth[user_id] = new_worth
+        bisect.insort(self.ranking, (-new_worth, user_id))
+
+    def inventory_changed(self, user_id: str, item_id: int, quantity: int):
+        """Apply a change of `quantity` units of an item to a user's inventory value"""
+        self.inventory_values[user_id] = self.inventory_values.get(user_id, 0) + self.item_values.get(item_id, 0) * quantity
+        self.refresh(user_id)
+
+    def reprice(self, shop_key: str, item_key: str):
+        """Re-read an item's price and revalue only its holders"""
+        item_id = catalog.item_ids.get((shop_key, item_key))
+        if item_id is None:
+            return
+        item_info = shops_data.get(shop_key, {}).get("items", {}).get(item_key)
+        new_value = get_final_price(item_info) if item_info else 0
+        delta = new_value - self.item_values.get(item_id, 0)
+        self.item_values[item_id] = new_value
+        if delta:
+            for user_id in item_holder_index.get(item_id, ()):
+                self.inventory_values[user_id] += delta * inventory_qty(user_id, item_id)
+                self.refresh(user_id)
+
+    def rank(self, user_id: str):
+        """1-based leaderboard position"""
+        return bisect.bisect_left(self.ranking, (-self.get(user_id), user_id)) + 1
+
+    def top(self, start: int, count: int):
+        return [(user_id, -negative_worth) for negative_worth, user_id in self.ranking[start:start + count]]
+
+net_worth = NetWorthIndex()
+ledger.on_change = net_worth.refresh
+
+# --------- Role Income -----------
+
+# user_id -> time income was last settled up to, accrual is computed lazily from this.
+# Changes only mark the file dirty and flush_analytics saves it. Each income ledger entry carries
+# the new settled-up-to time as its ref, so payouts written after the last save are replayed on startup.
+income_state = load_json("income_accruals.json")
+if "accruals" in income_state:
+    income_accruals = income_state["accruals"]
+    for entry in ledger.read_from(income_state.get("ledger_offset", 0)):
+        if entry["reason"] == "income" and entry.get("ref"):
+            income_accruals[entry["uid"]] = float(entry["ref"])
+else:
+    income_accruals = income_state  # Old layout, saved on every change so nothing to replay
+income_accruals_dirty = False
+
+def save_income_accruals():
+    global income_accruals_dirty
+    save_json("income_accruals.json", {"ledger_offset": ledger.size, "accruals": income_accruals})
+    income_accruals_dirty = False
+
+def get_income_rate(role_ids):
+    """Currency per day earned from the given roles"""
+    rules = server_settings.get("income_rules", {})
+    return sum(amount for role_id, amount in rules.items() if int(role_id) in role_ids)
+
+def settle_income(user_id: str, role_ids=None):
+    """Credit income owed since the last settlement, returns the amount paid.
+
+    Called whenever a balance is read or spent. Pass role_ids to settle against
+    specific roles (e.g. the roles held before a role change), otherwise the
+    member's current roles are used.
+    """
+    now = time.time()
+    if role_ids is None:
+        guild = bot.get_guild(GUILD_ID)
+        member = guild.get_member(int(user_id)) if guild else None
+        role_ids = get_member_role_ids(member) if member else frozenset()
+    
+    global income_accruals_dirty
+    rate = get_income_rate(role_ids)
+    last_settled = income_accruals.get(user_id)
+    if not rate:
+        # Nothing accrues without an income role
+        if income_accruals.pop(user_id, None) is not None:
+            income_accruals_dirty = True
+        return 0
+    if last_settled is None:
+        income_accruals[user_id] = now
+        income_accruals_dirty = True
+        return 0
+    
+    owed = int(rate * (now - last_settled) / 86400)
+    if owed <= 0:
+        return 0
+    # Only advance by the time actually paid for so fractional income carries over
+    settled_until = round(last_settled + owed * 86400 / rate, 3)
+    income_accruals[user_id] = settled_until
+    ledger.post(user_id, owed, "income", str(settled_until))
+    income_accruals_dirty = True
+    return owed
+
+def change_income_roles(user_id: str, before_role_ids, after_role_ids):
+    """Settle at the old rate, then carry the unpaid fraction over at the new rate"""
+    settle_income(user_id, before_role_ids)
+    old_rate = get_income_rate(before_role_ids)
+    new_rate = get_income_rate(after_role_ids)
+    if old_rate == new_rate:
+        return
+    last_settled = income_accruals.get(user_id)
+    if not old_rate or not new_rate or last_settled is None:
+        settle_income(user_id, after_role_ids)
+        return
+    
+    now = time.time()
+    carry = (now - last_settled) * old_rate / 86400  # Less than one unit of currency
+    income_accruals[user_id] = now - carry * 86400 / new_rate
+    global income_accruals_dirty
+    income_accruals_dirty = True
+
+# --------- Economy Locks -----------
+
+# user_id -> asyncio.Lock guarding that user's balance and inventory, entries disappear once no one holds or waits on them
+user_locks = weakref.WeakValueDictionary()
+
+@contextlib.asynccontextmanager
+async def lock_users(*user_ids):
+    """Hold the economy locks of every user involved in an operation.
+
+    Locks are always acquired in sorted user ID order so two operations touching the
+    same pair of users can't deadlock. Only change state inside the block and reply to
+    the user after it, so no network round-trip happens while the locks are held.
+    """
+    locks = [user_locks.setdefault(user_id, asyncio.Lock()) for user_id in sorted(set(user_ids))]
+    acquired = []
+    try:
+        for lock in locks:
+            await lock.acquire()
+            acquired.append(lock)
+        yield
+    finally:
+        for lock in reversed(acquired):
+            lock.release()
+
+# --------- Scheduler -----------
+
+class DeadlineScheduler:
+    """Persistent job scheduler backed by a min-heap of (due_time, job).
+
+    Jobs are rebuilt from their stores on start through the registered loaders, the
+    runner sleeps exactly until the next deadline (or until an earlier job is added)
+    and every job runs once with bounded concurrency.
+    """
+
+    def __init__(self, max_concurrency: int = SCHEDULER_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.heap = []  # (due_time, sequence, key), may hold cancelled entries
+        self.jobs = {}  # key -> (due_time, kind, payload)
+        self.handlers = {}  # kind -> async handler(payload)
+        self.loaders = {}  # kind -> function returning [(key, due_time, payload)]
+        self.sequence = itertools.count()
+        self.wakeup = None
+        self.semaphore = None
+        self.task = None
+        self.running = set()
+
+    def register(self, kind: str, handler, loader=None):
+        self.handlers[kind] = handler
+        if loader:
+            self.loaders[kind] = loader
+
+    def schedule(self, key: str, due_time: float, kind: str, payload=None):
+        """Add or replace the job stored under `key`"""
+        self.jobs[key] = (due_time, kind, payload)
+        heapq.heappush(self.heap, (due_time, next(self.sequence), key))
+        if self.wakeup and self.heap[0][2] == key:
+            self.wakeup.set()
+
+    def cancel(self, key: str):
+        # The heap entry is skipped lazily once it reaches the top
+        return self.jobs.pop(key, None) is not None
+
+    def start(self):
+        if self.task and not self.task.done():
+            return
+        self.wakeup = asyncio.Event()
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        for kind, loader in self.loaders.items():
+            for key, due_time, payload in loader():
+                self.schedule(key, due_time, kind, payload)
+        self.task = asyncio.create_task(self._run())
+
+    def pop_due(self, now: float):
+        due_jobs = []
+        while self.heap and self.heap[0][0] <= now:
+            due_time, _, key = heapq.heappop(self.heap)
+            job = self.jobs.get(key)
+            if job is None or job[0] != due_time:
+                continue  # Cancelled or rescheduled
+            del self.jobs[key]
+            due_jobs.append((key, job))
+        return due_jobs
+
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            for key, job in self.pop_due(time.time()):
+                task = asyncio.create_task(self._dispatch(key, job))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+
+            timeout = self.heap[0][0] - time.time() if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self, key: str, job: tuple):
+        _, kind, payload = job
+        async with self.semaphore:
+            try:
+                await self.handlers[kind](payload)
+            except Exception as e:
+                print(f"Error in scheduled job {key}: {str(e)}")
+
+scheduler = DeadlineScheduler()
+
+# --------- Reminder Store -----------
+
+class ReminderStore:
+    """Reminders kept as a snapshot plus an append-only journal of changes.
+
+    Adding, rescheduling or removing a reminder appends one journal line; the
+    snapshot is only rewritten every REMINDER_COMPACT_AFTER changes.
+    """
+
+    def __init__(self, snapshot_file: str = "reminders.json", journal_file: str = "reminders.jsonl"):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.reminders = load_json(snapshot_file)  # reminder_id -> reminder
+        journal = load_jsonl(journal_file)
+        for entry in journal:
+            self._apply(entry)
+        self.journal_size = len(journal)
+        self.by_user = {}  # user_id -> set of reminder IDs
+        for reminder_id, reminder in self.reminders.items():
+            self.by_user.setdefault(reminder["user_id"], set()).add(reminder_id)
+
+    def _apply(self, entry: dict):
+        if entry["op"] == "add":
+            self.reminders[entry["reminder"]["id"]] = entry["reminder"]
+        elif entry["op"] == "reschedule" and entry["id"] in self.reminders:
+            self.reminders[entry["id"]]["remind_time"] = entry["remind_time"]
+        elif entry["op"] == "remove":
+            self.reminders.pop(entry["id"], None)
+
+    def _log(self, entry: dict):
+        append_jsonl(self.journal_file, [entry])
+        self.journal_size += 1
+        if self.journal_size >= REMINDER_COMPACT_AFTER:
+            self.compact()
+
+    def compact(self):
+        save_json(self.snapshot_file, self.reminders)
+        open(self.journal_file, "w").close()
+        self.journal_size = 0
+
+    def get(self, reminder_id: str):
+        return self.reminders.get(reminder_id)
+
+    def add(self, reminder: dict):
+        if reminder["id"] in self.reminders:
+            raise ValueError(f"Reminder ID {reminder['id']} is already in use")
+        self.reminders[reminder["id"]] = reminder
+        self.by_user.setdefault(reminder["user_id"], set()).add(reminder["id"])
+        self._log({"op": "add", "reminder": reminder})
+
+    def reschedule(self, reminder_id: str, remind_time: int):
+        if reminder_id not in self.reminders:
+            return
+        self.reminders[reminder_id]["remind_time"] = remind_time
+        self._log({"op": "reschedule", "id": reminder_id, "remind_time": remind_time})
+
+    def remove(self, reminder_id: str):
+        reminder = self.reminders.pop(reminder_id, None)
+        if reminder is None:
+            return None
+        user_reminders = self.by_user.get(reminder["user_id"], set())
+        user_reminders.discard(reminder_id)
+        if not user_reminders:
+            self.by_user.pop(reminder["user_id"], None)
+        self._log({"op": "remove", "id": reminder_id})
+        return reminder
+
+    def for_user(self, user_id: str):
+        reminders = [self.reminders[reminder_id] for reminder_id in self.by_user.get(user_id, ())]
+        return sorted(reminders, key=lambda r: r["remind_time"])
+
+reminder_store = ReminderStore()
+
+# Move reminders saved in server_settings before the reminder store existed
+if server_settings.get("reminders"):
+    import uuid
+    for user_id, reminders in server_settings["reminders"].items():
+        for reminder in reminders:
+            reminder_id = reminder.get("id")
+            if not reminder_id or reminder_id in reminder_store.reminders:
+                reminder_id = uuid.uuid4().hex
+            reminder_store.add({
+                "id": reminder_id,
+                "user_id": user_id,
+                "channel_id": reminder["channel_id"],
+                "reminder": reminder["reminder"],
+                "remind_time": reminder["remind_time"],
+                "interval": None,
+            })
+    del server_settings["reminders"]
+    save_json("server_settings.json", server_settings)
+
+# --------- Activity History -----------
+
+def current_day():
+    """Days since the Unix epoch (UTC)"""
+    return int(time.time() // 86400)
+
+class ActivityHistory:
+    """Per-user ring buffers of daily message counts for rolling-window queries"""
+
+    def __init__(self, days: int = ACTIVITY_HISTORY_DAYS):
+        self.days = days
+        self.buffers = {}  # user_id -> array('H') of daily counts, slot = day % days
+        self.last_day = {}  # user_id -> last day written to the buffer
+
+    def _buffer_for(self, user_id: str, today: int):
+        buf = self.buffers.get(user_id)
+        if buf is None:
+            buf = array("H", bytes(2 * self.days))
+            self.buffers[user_id] = buf
+            self.last_day[user_id] = today
+            return buf
+
+        last = self.last_day[user_id]
+        if today > last:
+            # Zero the slots of days without activity since the last write
+            for day in range(last + 1, min(today, last + self.days) + 1):
+                buf[day % self.days] = 0
+            self.last_day[user_id] = today
+        return buf
+
+    def record(self, user_id: str, count: int = 1, day: int = None):
+        today = current_day() if day is None else day
+        buf = self._buffer_for(user_id, today)
+        slot = today % self.days
+        buf[slot] = min(0xFFFF, buf[slot] + count)
+
+    def window_sum(self, user_id: str, window_days: int, day: int = None):
+        """Messages sent by a user over the last `window_days` days, including today"""
+        buf = self.buffers.get(user_id)
+        if buf is None:
+            return 0
+
+        today = current_day() if day is None else day
+        window_days = max(1, min(window_days, self.days))
+        first = today - window_days + 1
+        last = min(self.last_day[user_id], today)
+        if last < first:
+            return 0
+
+        start = first % self.days
+        length = last - first + 1
+        if start + length <= self.days:
+            return sum(buf[start:start + length])
+        return sum(buf[start:]) + sum(buf[:start + length - self.days])
+
+    def top_users(self, window_days: int, limit: int = 15):
+        totals = ((user_id, self.window_sum(user_id, window_days)) for user_id in self.buffers)
+        return heapq.nlargest(limit, (item for item in totals if item[1] > 0), key=lambda x: x[1])
+
+    def to_json(self):
+        return {
+            user_id: {"day": self.last_day[user_id], "counts": base64.b64encode(buf.tobytes()).decode()}
+            for user_id, buf in self.buffers.items()
+        }
+
+    @classmethod
+    def from_json(cls, data: dict, days: int = ACTIVITY_HISTORY_DAYS):
+        history = cls(days)
+        for user_id, entry in data.items():
+            stored = array("H")
+            stored.frombytes(base64.b64decode(entry["counts"]))
+            last = entry["day"]
+            if len(stored) == days:
+                buf = stored
+            else:
+                # Buffer size changed since the snapshot, copy over the days that still fit
+                buf = array("H", bytes(2 * days))
+                for day in range(last - min(len(stored), days) + 1, last + 1):
+                    buf[day % days] = stored[day % len(stored)]
+            history.buffers[user_id] = buf
+            history.last_day[user_id] = last
+        return history
+
+activity_history = ActivityHistory.from_json(load_json("activity_history.json"))
+
+def describe_message_requirement(required_messages: dict):
+    amount = required_messages.get("amount", 0)
+    if required_messages.get("days"):
+        return f"{amount} messages in the last {required_messages['days']} days"
+    return f"{amount} {(required_messages.get('type') or 'all_time').replace('_', ' ')} messages"
+
+def get_required_message_count(user_id: str, required_messages: dict):
+    if required_messages.get("days"):
+        return activity_history.window_sum(user_id, required_messages["days"])
+    message_type = required_messages.get("type") or "all_time"
+    return member_stats.get(user_id, {}).get(f"{message_type}_messages", 0)
+
+# --------- Channel Activity Analytics -----------
+
+HOURS_PER_WEEK = 168
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+def current_week(timestamp: float = None):
+    """Monday-based week index since the Unix epoch (UTC)"""
+    timestamp = time.time() if timestamp is None else timestamp
+    return (int(timestamp // 86400) + 3) // 7
+
+def hour_of_week(timestamp: float = None):
+    tm = time.gmtime(time.time() if timestamp is None else timestamp)
+    return tm.tm_wday * 24 + tm.tm_hour
+
+class ChannelActivity:
+    """Per-channel hour-of-week message counts for the current and previous week"""
+
+    def __init__(self):
+        self.week = current_week()
+        self.current = {}  # channel_id -> array('I') of 168 hourly counts
+        self.previous = {}
+
+    def _rotate(self, week: int):
+        self.previous = self.current if week == self.week + 1 else {}
+        self.current = {}
+        self.week = week
+
+    def record(self, channel_id: str, timestamp: float = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        week = current_week(timestamp)
+        if week > self.week:
+            self._rotate(week)
+        counts = self.current.get(channel_id)
+        if counts is None:
+            counts = array("I", bytes(4 * HOURS_PER_WEEK))
+            self.current[channel_id] = counts
+        counts[hour_of_week(timestamp)] += 1
+
+    def refresh(self):
+        """Roll the weeks over if no message has done so yet"""
+        week = current_week()
+        if week > self.week:
+            self._rotate(week)
+
+    def channel_totals(self, previous: bool = False):
+        matrix = self.previous if previous else self.current
+        return {channel_id: sum(counts) for channel_id, counts in matrix.items()}
+
+    def hour_totals(self):
+        """Hour-of-week counts summed over every channel and both weeks"""
+        totals = [0] * HOURS_PER_WEEK
+        for matrix in (self.current, self.previous):
+            for counts in matrix.values():
+                for hour, count in enumerate(counts):
+                    totals[hour] += count
+        return totals
+
+    def to_json(self):
+        encode = lambda matrix: {channel_id: base64.b64encode(counts.tobytes()).decode() for channel_id, counts in matrix.items()}
+        return {"week": self.week, "current": encode(self.current), "previous": encode(self.previous)}
+
+    @classmethod
+    def from_json(cls, data: dict):
+        activity = cls()
+        if not data:
+            return activity
+
+        def decode(matrix):
+            decoded = {}
+            for channel_id, encoded in matrix.items():
+                counts = array("I")
+                counts.frombytes(base64.b64decode(encoded))
+                decoded[channel_id] = counts
+            return decoded
+
+        activity.week = data["week"]
+        activity.current = decode(data.get("current", {}))
+        activity.previous = decode(data.get("previous", {}))
+        activity.refresh()
+        return activity
+
+channel_activity = ChannelActivity.from_json(load_json("channel_activity.json"))
+
+def make_bar(value: int, maximum: int, length: int = 10):
+    filled = int(length * value / maximum) if maximum else 0
+    return "█" * filled + "░" * (length - filled)
+
+def format_change(current: int, previous: int):
+    if not previous:
+        return "new" if current else "—"
+    change = (current - previous) * 100 // previous
+    return f"+{change}%" if change >= 0 else f"{change}%"
+
+def build_server_activity_embed(report: str, guild: discord.Guild):
+    channel_activity.refresh()
+    this_week = channel_activity.channel_totals()
+    last_week = channel_activity.channel_totals(previous=True)
+
+    def channel_label(channel_id):
+        channel = guild.get_channel(int(channel_id))
+        return channel.mention if channel else f"<#{channel_id}>"
+
+    embed = discord.Embed(color=DEFAULT_EMBED_COLOR)
+
+    if report == "channels":
+        embed.title = "Top Channels (This Week)"
+        top_channels = heapq.nlargest(10, this_week.items(), key=lambda x: x[1])
+        if not top_channels:
+            embed.description = "No data to display."
+            return embed
+        maximum = top_channels[0][1]
+        embed.description = "\n".join(
+            f"{rank}. {channel_label(channel_id)} `{make_bar(count, maximum)}` {count} ({format_change(count, last_week.get(channel_id, 0))})"
+            for rank, (channel_id, count) in enumerate(top_channels, start=1)
+        )
+    elif report == "hours":
+        embed.title = "Peak Hours (Last 2 Weeks, UTC)"
+        totals = channel_activity.hour_totals()
+        if not any(totals):
+            embed.description = "No data to display."
+            return embed
+        day_totals = [sum(totals[day * 24:(day + 1) * 24]) for day in range(7)]
+        hour_of_day = [sum(totals[day * 24 + hour] for day in range(7)) for hour in range(24)]
+        peak_slots = heapq.nlargest(5, range(HOURS_PER_WEEK), key=lambda hour: totals[hour])
+        embed.add_field(
+            name="Busiest Days",
+            value="\n".join(f"{WEEKDAY_NAMES[day]} `{make_bar(count, max(day_totals))}` {count}" for day, count in enumerate(day_totals)),
+            inline=False
+        )
+        embed.add_field(
+            name="Busiest Hours",
+            value="\n".join(f"{hour:02d}:00 - {hour_of_day[hour]} messages" for hour in heapq.nlargest(5, range(24), key=lambda h: hour_of_day[h])),
+            inline=True
+        )
+        embed.add_field(
+            name="Peak Slots",
+            value="\n".join(f"{WEEKDAY_NAMES[slot // 24]} {slot % 24:02d}:00 - {totals[slot]}" for slot in peak_slots if totals[slot]),
+            inline=True
+        )
+    else:
+        embed.title = "Activity Trends (This Week vs Last Week)"
+        total_now = sum(this_week.values())
+        total_before = sum(last_week.values())
+        embed.add_field(name="This Week", value=str(total_now), inline=True)
+        embed.add_field(name="Last Week", value=str(total_before), inline=True)
+        embed.add_field(name="Change", value=format_change(total_now, total_before), inline=True)
+
+        changes = {channel_id: this_week.get(channel_id, 0) - last_week.get(channel_id, 0) for channel_id in set(this_week) | set(last_week)}
+        risers = [item for item in heapq.nlargest(5, changes.items(), key=lambda x: x[1]) if item[1] > 0]
+        fallers = [item for item in heapq.nsmallest(5, changes.items(), key=lambda x: x[1]) if item[1] < 0]
+        if risers:
+            embed.add_field(name="Rising", value="\n".join(f"{channel_label(channel_id)} +{change}" for channel_id, change in risers), inline=False)
+        if fallers:
+            embed.add_field(name="Falling", value="\n".join(f"{channel_label(channel_id)} {change}" for channel_id, change in fallers), inline=False)
+
+    return embed
+
+# --------- Active User Sketches -----------
+
+_HLL_POWERS = [2.0 ** -rank for rank in range(65)]
+
+def hash64(value: str):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+class HyperLogLog:
+    """Approximate distinct counter using 2^precision one-byte registers"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: bytearray = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.size)
+
+    def add(self, value: str):
+        hashed = hash64(value)
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        size = self.size
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(_HLL_POWERS[rank] for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+class ActiveUserSketches:
+    """HyperLogLog sketches of active users per (day, channel), plus a server-wide sketch per day.
+
+    Each day is stored in its own active_users/<day>.json and only days that changed
+    since the last save are rewritten, which in practice is just today.
+    """
+
+    SERVER_KEY = "server"
+
+    def __init__(self, retention_days: int = ACTIVITY_HISTORY_DAYS, directory: str = "active_users"):
+        self.retention_days = retention_days
+        self.directory = directory
+        self.days = {}  # day -> {channel_id or SERVER_KEY: HyperLogLog}
+        self.dirty = set()  # days changed since the last save
+
+    def record(self, channel_id: str, user_id: str, day: int = None):
+        today = current_day() if day is None else day
+        sketches = self.days.get(today)
+        if sketches is None:
+            sketches = {}
+            self.days[today] = sketches
+            self.prune(today)
+        for key in (channel_id, self.SERVER_KEY):
+            sketch = sketches.get(key)
+            if sketch is None:
+                sketch = HyperLogLog()
+                sketches[key] = sketch
+            sketch.add(user_id)
+        self.dirty.add(today)
+
+    def path(self, day: int):
+        return os.path.join(self.directory, f"{day}.json")
+
+    def prune(self, today: int):
+        for day in [day for day in self.days if day <= today - self.retention_days]:
+            del self.days[day]
+            self.dirty.discard(day)
+            if os.path.isfile(self.path(day)):
+                os.remove(self.path(day))
+
+    def count(self, window_days: int, channel_id: str = None, day: int = None):
+        """Approximate distinct active users over the last `window_days` days"""
+        today = current_day() if day is None else day
+        key = channel_id or self.SERVER_KEY
+        merged = HyperLogLog()
+        for window_day in range(today - window_days + 1, today + 1):
+            sketch = self.days.get(window_day, {}).get(key)
+            if sketch is not None:
+                merged.merge(sketch)
+        return merged.count()
+
+    def save(self):
+        if self.dirty:
+            os.makedirs(self.directory, exist_ok=True)
+        for day in self.dirty:
+            sketches = self.days[day]
+            save_json(self.path(day), {key: base64.b64encode(bytes(sketch.registers)).decode() for key, sketch in sketches.items()})
+        self.dirty.clear()
+
+    @classmethod
+    def load(cls, legacy_file: str = "active_users.json"):
+        store = cls()
+        if os.path.isdir(store.directory):
+            for file_name in os.listdir(store.directory):
+                day, extension = os.path.splitext(file_name)
+                if extension == ".json" and day.isdigit():
+                    store.days[int(day)] = {
+                        key: HyperLogLog(registers=bytearray(base64.b64decode(encoded)))
+                        for key, encoded in load_json(store.path(int(day))).items()
+                    }
+        
+        # Split the old single-file layout into per-day files
+        if os.path.isfile(legacy_file):
+            for day, sketches in load_json(legacy_file).items():
+                store.days[int(day)] = {
+                    key: HyperLogLog(registers=bytearray(base64.b64decode(encoded)))
+                    for key, encoded in sketches.items()
+                }
+                store.dirty.add(int(day))
+            store.prune(current_day())
+            store.save()
+            os.remove(legacy_file)
+        store.prune(current_day())
+        return store
+
+active_users = ActiveUserSketches.load()
+
+# --------- Trending Terms -----------
+
+MENTION_RE = re.compile(r"<[@#][!&]?\d+>|https?://\S+")
+CUSTOM_EMOJI_RE = re.compile(r"<a?:\w{2,32}:\d{15,21}>")
+UNICODE_EMOJI_RE = re.compile("[\U0001F300-\U0001FAFF\u2600-\u27BF]")
+WORD_RE = re.compile(r"[a-z][a-z0-9']{2,31}")
+STOP_WORDS = frozenset("""
+    the and for are but not you your yours all any can had her was one our out has him his how its may new now
+    see two who did get got let put say she too use that this with have from they them then than there their what
+    when where which while will would could should been being into just like some such only also very much more
+    most other over same here about after again before because does doing dont im ive its thats yeah yes okay lol
+""".split())
+
+def tokenize_message(content: str):
+    """Distinct custom emoji, unicode emoji and words in a message (capped per message)"""
+    content = MENTION_RE.sub(" ", content)
+    tokens = dict.fromkeys(CUSTOM_EMOJI_RE.findall(content))
+    content = CUSTOM_EMOJI_RE.sub(" ", content)
+    tokens.update(dict.fromkeys(UNICODE_EMOJI_RE.findall(content)))
+    tokens.update(dict.fromkeys(word for word in WORD_RE.findall(content.lower()) if word not in STOP_WORDS))
+    return list(tokens)[:TRENDING_MAX_TOKENS]
+
+def is_emoji_token(token: str):
+    return not token[0].isalpha()
+
+class DecayedTermCounter:
+    """Exponentially decayed Count-Min Sketch with a small heavy-hitters heap.
+
+    Counts are stored inflated by exp((t - epoch) / lifetime) so decay costs nothing per
+    update; the sketch is rescaled once the inflation factor grows too large.
+    """
+
+    def __init__(self, lifetime: float, width: int = TRENDING_SKETCH_WIDTH, depth: int = TRENDING_SKETCH_DEPTH):
+        self.lifetime = lifetime
+        self.width = width
+        self.depth = depth
+        self.epoch = time.time()
+        self.counts = array("d", bytes(8 * width * depth))
+        self.top = {}  # term -> inflated estimate
+        self.heap = []  # (inflated estimate, term), may hold stale entries
+
+    def indexes(self, term: str):
+        digest = hashlib.blake2b(term.encode(), digest_size=4 * self.depth).digest()
+        return [
+            row * self.width + int.from_bytes(digest[4 * row:4 * row + 4], "little") % self.width
+            for row in range(self.depth)
+        ]
+
+    def _rescale(self, now: float):
+        factor = math.exp(-(now - self.epoch) / self.lifetime)
+        for i in range(len(self.counts)):
+            self.counts[i] *= factor
+        self.top = {term: value * factor for term, value in self.top.items()}
+        self.heap = [(value, term) for term, value in self.top.items()]
+        heapq.heapify(self.heap)
+        self.epoch = now
+
+    def add(self, term: str, now: float = None):
+        now = time.time() if now is None else now
+        if now - self.epoch > 20 * self.lifetime:
+            self._rescale(now)
+
+        weight = math.exp((now - self.epoch) / self.lifetime)
+        estimate = None
+        for index in self.indexes(term):
+            self.counts[index] += weight
+            if estimate is None or self.counts[index] < estimate:
+                estimate = self.counts[index]
+        self._offer(term, estimate)
+
+    def _offer(self, term: str, estimate: float):
+        if term not in self.top and len(self.top) >= TRENDING_TOP_K:
+            # Drop stale heap entries to find the current minimum candidate
+            while self.top.get(self.heap[0][1]) != self.heap[0][0]:
+                heapq.heappop(self.heap)
+            if estimate <= self.heap[0][0]:
+                return
+            _, evicted = heapq.heappop(self.heap)
+            del self.top[evicted]
+
+        self.top[term] = estimate
+        heapq.heappush(self.heap, (estimate, term))
+        if len(self.heap) > 4 * TRENDING_TOP_K:
+            self.heap = [(value, term) for term, value in self.top.items()]
+            heapq.heapify(self.heap)
+
+    def top_terms(self, limit: int, emoji: bool = None, now: float = None):
+        """Top (term, decayed count) pairs, optionally only emoji (True) or only words (False)"""
+        now = time.time() if now is None else now
+        decay = math.exp(-(now - self.epoch) / self.lifetime)
+        candidates = (
+            (term, value * decay) for term, value in self.top.items()
+            if emoji is None or is_emoji_token(term) == emoji
+        )
+        return heapq.nlargest(limit, candidates, key=lambda x: x[1])
+
+    def to_json(self):
+        return {
+            "epoch": self.epoch,
+            "counts": base64.b64encode(self.counts.tobytes()).decode(),
+            "top": self.top,
+        }
+
+    def load(self, data: dict):
+        counts = array("d")
+        counts.frombytes(base64.b64decode(data["counts"]))
+        if len(counts) == len(self.counts):
+            self.epoch = data["epoch"]
+            self.counts = counts
+            for term, value in data.get("top", {}).items():
+                self._offer(term, value)
+
+class TrendingTerms:
+    """Decayed term counters approximating the last hour and the last day"""
+
+    WINDOWS = {"hour": 3600, "day": 86400}
+
+    def __init__(self):
+        self.counters = {window: DecayedTermCounter(lifetime) for window, lifetime in self.WINDOWS.items()}
+
+    def record(self, content: str):
+        now = time.time()
+        for token in tokenize_message(content):
+            for counter in self.counters.values():
+                counter.add(token, now)
+
+    def to_json(self):
+        return {window: counter.to_json() for window, counter in self.counters.items()}
+
+    @classmethod
+    def from_json(cls, data: dict):
+        trending = cls()
+        for window, counter_data in data.items():
+            if window in trending.counters:
+                trending.counters[window].load(counter_data)
+        return trending
+
+trending_terms = TrendingTerms.from_json(load_json("trending_terms.json"))
+
+# --------- Weighted Sampling -----------
+
+def weighted_sample(weights, k: int, rng: random.Random = None):
+    """Pick up to k distinct keys from (key, weight) pairs without replacement.
+
+    Efraimidis-Spirakis: every key draws log(u) / weight and the k largest win,
+    which is O(n log k) time and never expands entries into a list.
+    """
+    rng = rng or random.Random()
+    keyed = (
+        (math.log(1.0 - rng.random()) / weight, key)
+        for key, weight in weights
+        if weight > 0
+    )
+    return [key for _, key in heapq.nlargest(k, keyed)]
+
+def new_draw_seed():
+    # Kept within 48 bits so staff can pass it back through an integer slash command option
+    return secrets.randbits(48)
+
 # --------- Views for Pagination -----------
 
 class LevelLeaderboardView(discord.ui.View):
@@ -313,6 +1689,62 @@ class LevelLeaderboardView(discord.ui.View):
         else:
             await interaction.response.defer()
 
+class TransactionsView(discord.ui.View):
+    def __init__(self, user_id: str):
+        super().__init__(timeout=300)
+        self.user_id = user_id
+        self.page = 0
+
+    async def update_message(self, interaction: discord.Interaction):
+        embed = build_transactions_embed(self.user_id, self.page)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.gray)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.page > 0:
+            self.page -= 1
+            await self.update_message(interaction)
+        else:
+            await interaction.response.defer()
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.gray)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        _, total = ledger.history(self.user_id, 0, 0)
+        max_page = max(0, (total - 1) // 10)
+        if self.page < max_page:
+            self.page += 1
+            await self.update_message(interaction)
+        else:
+            await interaction.response.defer()
+
+class AuctionListView(discord.ui.View):
+    def __init__(self, filters: dict):
+        super().__init__(timeout=300)
+        self.filters = filters
+        self.page = 0
+
+    async def update_message(self, interaction: discord.Interaction):
+        embed = build_auction_list_embed(interaction.guild, self.filters, self.page)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.gray)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self.page > 0:
+            self.page -= 1
+            await self.update_message(interaction)
+        else:
+            await interaction.response.defer()
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.gray)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        total = len(auction_lookup.query(**self.filters))
+        max_page = max(0, (total - 1) // 10)
+        if self.page < max_page:
+            self.page += 1
+            await self.update_message(interaction)
+        else:
+            await interaction.response.defer()
+
 # --------- Guild Restriction Check -----------
 
 def guild_only():
@@ -379,22 +1811,26 @@ async def level_leaderboard(interaction: discord.Interaction):
 
 @tree.command(name="messages", description="Show your message statistics", guild=discord.Object(id=GUILD_ID))
 @guild_only()
-@app_commands.describe(message_type="Type of messages to display")
+@app_commands.describe(
+    message_type="Type of messages to display (defaults to All Time)",
+    days=f"Count messages over the last N days instead (1-{ACTIVITY_HISTORY_DAYS}, optional)"
+)
 @app_commands.choices(message_type=[
     app_commands.Choice(name="Daily", value="daily"),
     app_commands.Choice(name="Weekly", value="weekly"),
     app_commands.Choice(name="Monthly", value="monthly"),
     app_commands.Choice(name="All Time", value="all_time"),
 ])
-async def messages_self(interaction: discord.Interaction, message_type: app_commands.Choice[str]):
-    embed = build_message_embed(interaction.user, message_type.value)
+async def messages_self(interaction: discord.Interaction, message_type: app_commands.Choice[str] = None, days: app_commands.Range[int, 1, ACTIVITY_HISTORY_DAYS] = None):
+    embed = build_message_embed(interaction.user, message_type.value if message_type else "all_time", days)
     await interaction.response.send_message(embed=embed)
 
 @tree.command(name="messages_user", description="Show another user's message statistics", guild=discord.Object(id=GUILD_ID))
 @guild_only()
 @app_commands.describe(
-    message_type="Type of messages to display",
-    user="User to check"
+    message_type="Type of messages to display (defaults to All Time)",
+    user="User to check",
+    days=f"Count messages over the last N days instead (1-{ACTIVITY_HISTORY_DAYS}, optional)"
 )
 @app_commands.choices(message_type=[
     app_commands.Choice(name="Daily", value="daily"),
@@ -402,8 +1838,102 @@ async def messages_self(interaction: discord.Interaction, message_type: app_comm
     app_commands.Choice(name="Monthly", value="monthly"),
     app_commands.Choice(name="All Time", value="all_time"),
 ])
-async def messages_user(interaction: discord.Interaction, message_type: app_commands.Choice[str], user: discord.Member):
-    embed = build_message_embed(user, message_type.value)
+async def messages_user(interaction: discord.Interaction, user: discord.Member, message_type: app_commands.Choice[str] = None, days: app_commands.Range[int, 1, ACTIVITY_HISTORY_DAYS] = None):
+    embed = build_message_embed(user, message_type.value if message_type else "all_time", days)
+    await interaction.response.send_message(embed=embed)
+
+@tree.command(name="messages_leaderboard", description="Show the most active members over the last N days", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+@app_commands.describe(days=f"Number of days to count (1-{ACTIVITY_HISTORY_DAYS})")
+async def messages_leaderboard(interaction: discord.Interaction, days: app_commands.Range[int, 1, ACTIVITY_HISTORY_DAYS] = 7):
+    top_users = activity_history.top_users(days)
+    
+    embed = discord.Embed(
+        title=f"Message Leaderboard (Last {days} Days)",
+        color=DEFAULT_EMBED_COLOR,
+    )
+    
+    if not top_users:
+        embed.description = "No data to display."
+    else:
+        embed.description = "\n".join(
+            f"{rank}. <@{user_id}> - {count} messages"
+            for rank, (user_id, count) in enumerate(top_users, start=1)
+        )
+    
+    await interaction.response.send_message(embed=embed)
+
+@tree.command(name="server_activity", description="Show server activity analytics", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+@app_commands.describe(report="Which report to show")
+@app_commands.choices(report=[
+    app_commands.Choice(name="Top Channels", value="channels"),
+    app_commands.Choice(name="Peak Hours", value="hours"),
+    app_commands.Choice(name="Trends", value="trends"),
+])
+async def server_activity(interaction: discord.Interaction, report: app_commands.Choice[str]):
+    if not has_staff_role(interaction):
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+        return
+    
+    embed = build_server_activity_embed(report.value, interaction.guild)
+    await interaction.response.send_message(embed=embed)
+
+@tree.command(name="active_users", description="Show approximate daily, weekly and monthly active users", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+@app_commands.describe(
+    channel="Only count activity in this channel (optional)",
+    days=f"Also show a custom window of N days (1-{ACTIVITY_HISTORY_DAYS}, optional)"
+)
+async def active_users_stats(interaction: discord.Interaction, channel: discord.TextChannel = None, days: app_commands.Range[int, 1, ACTIVITY_HISTORY_DAYS] = None):
+    if not has_staff_role(interaction):
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+        return
+    
+    channel_id = str(channel.id) if channel else None
+    scope = channel.mention if channel else interaction.guild.name
+    
+    embed = discord.Embed(title="Active Users", description=f"Approximate unique active members in {scope}", color=DEFAULT_EMBED_COLOR)
+    embed.add_field(name="Daily", value=str(active_users.count(1, channel_id)), inline=True)
+    embed.add_field(name="Weekly", value=str(active_users.count(7, channel_id)), inline=True)
+    embed.add_field(name="Monthly", value=str(active_users.count(30, channel_id)), inline=True)
+    if days:
+        embed.add_field(name=f"Last {days} Days", value=str(active_users.count(days, channel_id)), inline=True)
+    embed.set_footer(text=f"Estimated with HyperLogLog (±{104 / math.sqrt(1 << HLL_PRECISION):.1f}%)")
+    
+    await interaction.response.send_message(embed=embed)
+
+@tree.command(name="trending", description="Show trending terms and emoji", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+@app_commands.describe(window="Time window", kind="What to show")
+@app_commands.choices(
+    window=[
+        app_commands.Choice(name="Last Hour", value="hour"),
+        app_commands.Choice(name="Last Day", value="day"),
+    ],
+    kind=[
+        app_commands.Choice(name="Terms and Emoji", value="all"),
+        app_commands.Choice(name="Terms Only", value="words"),
+        app_commands.Choice(name="Emoji Only", value="emoji"),
+    ]
+)
+async def trending(interaction: discord.Interaction, window: app_commands.Choice[str], kind: app_commands.Choice[str] = None):
+    if not has_staff_role(interaction):
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+        return
+    
+    counter = trending_terms.counters[window.value]
+    embed = discord.Embed(title=f"Trending ({window.name})", color=DEFAULT_EMBED_COLOR)
+    
+    kind_value = kind.value if kind else "all"
+    if kind_value in ("all", "words"):
+        words = counter.top_terms(10, emoji=False)
+        embed.add_field(name="Terms", value="\n".join(f"{rank}. {term} ({score:.0f})" for rank, (term, score) in enumerate(words, start=1)) or "No data", inline=True)
+    if kind_value in ("all", "emoji"):
+        emoji = counter.top_terms(10, emoji=True)
+        embed.add_field(name="Emoji", value="\n".join(f"{rank}. {term} ({score:.0f})" for rank, (term, score) in enumerate(emoji, start=1)) or "No data", inline=True)
+    embed.set_footer(text="Scores are time-decayed message counts")
+    
     await interaction.response.send_message(embed=embed)
 
 # --------- Verification System -----------
@@ -572,7 +2102,7 @@ async def shop_create(interaction: discord.Interaction, shop_name: str, descript
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
         return
     
-    shop_key = shop_name.lower().replace(" ", "_")
+    shop_key = normalize_key(shop_name)
     if shop_key in shops_data:
         await interaction.response.send_message("A shop with this name already exists.")
         return
@@ -582,6 +2112,9 @@ async def shop_create(interaction: discord.Interaction, shop_name: str, descript
         "description": description,
         "items": {}
     }
+    catalog.register_shop(shop_key)
+    catalog.save()
+    shop_index.add(shop_key, shop_name, shop_name, shop_name)
     save_json("shops.json", shops_data)
     await interaction.response.send_message(f"Shop '{shop_name}' created successfully!")
 
@@ -591,47 +2124,127 @@ async def shop_create(interaction: discord.Interaction, shop_name: str, descript
     shop_name="Name of the shop",
     item="Item name",
     price="Price in currency",
-    description="Item description"
+    description="Item description",
+    stock="Limited stock (optional, unlimited if not set)"
 )
-async def shop_add(interaction: discord.Interaction, shop_name: str, item: str, price: int, description: str):
+@app_commands.autocomplete(shop_name=shop_autocomplete)
+async def shop_add(interaction: discord.Interaction, shop_name: str, item: str, price: int, description: str, stock: app_commands.Range[int, 0] = None):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
         return
     
-    shop_key = shop_name.lower().replace(" ", "_")
+    shop_key = normalize_key(shop_name)
     if shop_key not in shops_data:
         await interaction.response.send_message("Shop not found.")
         return
     
-    item_key = item.lower().replace(" ", "_")
+    item_key = normalize_key(item)
     currency_symbol = get_currency_symbol()
     shops_data[shop_key]["items"][item_key] = {
         "name": item,
         "price": price,
         "description": description,
-        "discount": 0
+        "discount": 0,
+        "stock": stock,
+        "sale_start": None,
+        "sale_end": None
     }
+    catalog.register_item(shop_key, item_key)
+    catalog.save()
+    index_shop_item(shop_key, item_key)
+    net_worth.reprice(shop_key, item_key)
+    bump_shop_version(shop_key)
     save_json("shops.json", shops_data)
     await interaction.response.send_message(f"Added {item} to {shop_name} for {currency_symbol}{price}.")
 
 @tree.command(name="shop_remove", description="Remove an item from a shop", guild=discord.Object(id=GUILD_ID))
 @guild_only()
-@app_commands.describe(shop_name="Name of the shop", item="Item name")
-async def shop_remove(interaction: discord.Interaction, shop_name: str, item: str):
+@app_commands.describe(
+    shop_name="Name of the shop",
+    item="Item name",
+    refund="Refund holders the current price for each one they own (default: yes)",
+    replacement="Give holders this item from the same shop instead of a refund (optional)"
+)
+@app_commands.autocomplete(shop_name=shop_autocomplete, item=item_autocomplete("shop_name"), replacement=item_autocomplete("shop_name"))
+async def shop_remove(interaction: discord.Interaction, shop_name: str, item: str, refund: bool = True, replacement: str = None):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
         return
     
-    shop_key = shop_name.lower().replace(" ", "_")
-    item_key = item.lower().replace(" ", "_")
+    shop_key = normalize_key(shop_name)
+    item_key = normalize_key(item)
     
     if shop_key not in shops_data or item_key not in shops_data[shop_key]["items"]:
         await interaction.response.send_message("Shop or item not found.")
         return
     
-    del shops_data[shop_key]["items"][item_key]
+    replacement_key = normalize_key(replacement) if replacement else None
+    if replacement_key and (replacement_key == item_key or replacement_key not in shops_data[shop_key]["items"]):
+        await interaction.response.send_message("Replacement item not found in this shop.")
+        return
+    
+    # Delete the item before awaiting any lock so it can no longer be bought
+    item_id = catalog.item_ids[(shop_key, item_key)]
+    unit_refund = get_final_price(shops_data[shop_key]["items"].pop(item_key))
+    item_indexes[shop_key].remove(item_key)
+    net_worth.reprice(shop_key, item_key)
+    bump_shop_version(shop_key)
     save_json("shops.json", shops_data)
-    await interaction.response.send_message(f"Removed {item} from {shop_name}.")
+    
+    # Take the item from every holder, then refund them or hand out the replacement.
+    # Gifts and trades can still add holders while the locks are awaited, so retry
+    # with the larger set until no holder is missing from the locked one.
+    while True:
+        locked = set(item_holder_index.get(item_id, ()))
+        async with lock_users(*locked):
+            if not item_holder_index.get(item_id, set()) <= locked:
+                continue
+            holders = list(item_holder_index.get(item_id, ()))
+            refunds = []
+            for user_id in holders:
+                quantity = inventory_qty(user_id, item_id)
+                inventory_remove(user_id, item_id, quantity)
+                if replacement_key:
+                    inventory_add(user_id, catalog.register_item(shop_key, replacement_key), quantity)
+                elif refund and unit_refund:
+                    refunds.append((user_id, unit_refund * quantity, "shop_refund", f"{shop_key}/{item_key}"))
+            if refunds:
+                ledger.post_many(refunds)
+        break
+    
+    if holders:
+        save_json("inventories.json", user_inventories)
+    
+    summary = f"Removed {item} from {shop_name}."
+    if holders and replacement_key:
+        summary += f" {len(holders)} holders received {shops_data[shop_key]['items'][replacement_key]['name']} instead."
+    elif refunds:
+        summary += f" Refunded {len(refunds)} holders a total of {get_currency_symbol()}{sum(change[1] for change in refunds)}."
+    elif holders:
+        summary += f" Removed it from {len(holders)} holders' inventories."
+    await interaction.response.send_message(summary)
+
+@tree.command(name="item_holders", description="List who owns a shop item", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+@app_commands.describe(shop_name="Name of the shop", item="Item name")
+@app_commands.autocomplete(shop_name=shop_autocomplete, item=item_autocomplete("shop_name"))
+async def item_holders(interaction: discord.Interaction, shop_name: str, item: str):
+    if not has_staff_role(interaction):
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+        return
+    
+    item_id = catalog.item_ids.get((normalize_key(shop_name), normalize_key(item)))
+    holders = item_holder_index.get(item_id, set())
+    if not holders:
+        await interaction.response.send_message("Nobody owns this item.", ephemeral=True)
+        return
+    
+    ranked = heapq.nlargest(20, holders, key=lambda user_id: inventory_qty(user_id, item_id))
+    embed = discord.Embed(title=f"Holders of {item}", color=DEFAULT_EMBED_COLOR)
+    embed.description = "\n".join(f"<@{user_id}> x{inventory_qty(user_id, item_id)}" for user_id in ranked)
+    total = sum(inventory_qty(user_id, item_id) for user_id in holders)
+    embed.set_footer(text=f"{len(holders)} holders • {total} owned in total")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @tree.command(name="shop_edit", description="Edit an item in a shop", guild=discord.Object(id=GUILD_ID))
 @guild_only()
@@ -639,15 +2252,19 @@ async def shop_remove(interaction: discord.Interaction, shop_name: str, item: st
     shop_name="Name of the shop",
     item="Item name",
     new_price="New price (optional)",
-    new_description="New description (optional)"
+    new_description="New description (optional)",
+    new_stock="New stock, -1 for unlimited (optional)",
+    sale_starts_in_minutes="Only sell the item from this many minutes from now (optional)",
+    sale_duration_minutes="Stop selling the item this many minutes after the sale starts, 0 to remove the sale window (optional)"
 )
-async def shop_edit(interaction: discord.Interaction, shop_name: str, item: str, new_price: int = None, new_description: str = None):
+@app_commands.autocomplete(shop_name=shop_autocomplete, item=item_autocomplete("shop_name"))
+async def shop_edit(interaction: discord.Interaction, shop_name: str, item: str, new_price: int = None, new_description: str = None, new_stock: app_commands.Range[int, -1] = None, sale_starts_in_minutes: app_commands.Range[int, 0] = None, sale_duration_minutes: app_commands.Range[int, 0] = None):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
         return
     
-    shop_key = shop_name.lower().replace(" ", "_")
-    item_key = item.lower().replace(" ", "_")
+    shop_key = normalize_key(shop_name)
+    item_key = normalize_key(item)
     
     if shop_key not in shops_data or item_key not in shops_data[shop_key]["items"]:
         await interaction.response.send_message("Shop or item not found.")
@@ -657,7 +2274,20 @@ async def shop_edit(interaction: discord.Interaction, shop_name: str, item: str,
         shops_data[shop_key]["items"][item_key]["price"] = new_price
     if new_description is not None:
         shops_data[shop_key]["items"][item_key]["description"] = new_description
+    if new_stock is not None:
+        shops_data[shop_key]["items"][item_key]["stock"] = None if new_stock < 0 else new_stock
+    
+    # Sale window, a duration of 0 clears it
+    item_info = shops_data[shop_key]["items"][item_key]
+    if sale_duration_minutes == 0:
+        item_info["sale_start"] = item_info["sale_end"] = None
+    elif sale_starts_in_minutes is not None or sale_duration_minutes is not None:
+        item_info["sale_start"] = int(time.time()) + (sale_starts_in_minutes or 0) * 60
+        item_info["sale_end"] = item_info["sale_start"] + sale_duration_minutes * 60 if sale_duration_minutes else None
     
+    if new_price is not None:
+        net_worth.reprice(shop_key, item_key)
+    bump_shop_version(shop_key)
     save_json("shops.json", shops_data)
     await interaction.response.send_message(f"Updated {item} in {shop_name}.")
 
@@ -668,6 +2298,7 @@ async def shop_edit(interaction: discord.Interaction, shop_name: str, item: str,
     item="Item name",
     discount_percent="Discount percentage (0-100)"
 )
+@app_commands.autocomplete(shop_name=shop_autocomplete, item=item_autocomplete("shop_name"))
 async def shop_discount(interaction: discord.Interaction, shop_name: str, item: str, discount_percent: int):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
@@ -677,23 +2308,133 @@ async def shop_discount(interaction: discord.Interaction, shop_name: str, item:
         await interaction.response.send_message("Discount must be between 0 and 100 percent.")
         return
     
-    shop_key = shop_name.lower().replace(" ", "_")
-    item_key = item.lower().replace(" ", "_")
+    shop_key = normalize_key(shop_name)
+    item_key = normalize_key(item)
     
     if shop_key not in shops_data or item_key not in shops_data[shop_key]["items"]:
         await interaction.response.send_message("Shop or item not found.")
         return
     
     shops_data[shop_key]["items"][item_key]["discount"] = discount_percent
+    net_worth.reprice(shop_key, item_key)
+    bump_shop_version(shop_key)
     save_json("shops.json", shops_data)
     await interaction.response.send_message(f"Set {discount_percent}% discount on {item} in {shop_name}.")
 
+# --------- Shop Catalog Pages -----------
+
+SHOP_SORTS = {
+    "price": ("Price", lambda item_info: (get_final_price(item_info), item_info["name"].lower())),
+    "name": ("Name", lambda item_info: item_info["name"].lower()),
+    "discount": ("Discount", lambda item_info: (-item_info.get("discount", 0), item_info["name"].lower())),
+}
+SHOP_FILTERS = {
+    "all": ("All Items", lambda item_info: True),
+    "sale": ("On Sale", lambda item_info: item_info.get("discount", 0) > 0),
+}
+
+shop_versions = {}  # shop_key -> version, bumped whenever the shop's items change
+shop_page_cache = {}  # (shop_key, sort, filter) -> (version, currency symbol, expiry, pages)
+
+def bump_shop_version(shop_key: str):
+    shop_versions[shop_key] = shop_versions.get(shop_key, 0) + 1
+
+def get_shop_pages(shop_key: str, sort: str, item_filter: str):
+    """Return the shop's catalog as pages of (name, value) embed fields.
+
+    Pages are cached per shop version until the next sale window opens or closes, since
+    that changes the availability text.
+    """
+    version = shop_versions.get(shop_key, 0)
+    currency_symbol = get_currency_symbol()
+    now = time.time()
+    cached = shop_page_cache.get((shop_key, sort, item_filter))
+    if cached and cached[0] == version and cached[1] == currency_symbol and now < cached[2]:
+        return cached[3]
+    
+    shop_info = shops_data[shop_key]
+    items = sorted(filter(SHOP_FILTERS[item_filter][1], shop_info["items"].values()), key=SHOP_SORTS[sort][1])
+    expiry = min((boundary for item_info in items for boundary in (item_info.get("sale_start"), item_info.get("sale_end")) if boundary and boundary > now), default=math.inf)
+    # Room left for fields once the title, description and footer are in the embed
+    budget = EMBED_TOTAL_LIMIT - len(f"{shop_info['name']} - Items") - len(shop_info["description"]) - 100
+    pages = [[]]
+    used = 0
+    for item_info in items:
+        discount = item_info.get("discount", 0)
+        price_text = f"{currency_symbol}{get_final_price(item_info)}"
+        if discount > 0:
+            price_text += f" ~~{currency_symbol}{item_info['price']}~~ ({discount}% off)"
+        availability = describe_availability(item_info)
+        value = f"{item_info['description']}\n{availability}" if availability else item_info["description"]
+        field = (f"{item_info['name']} - {price_text}"[:256], value[:1024])
+        size = len(field[0]) + len(field[1])
+        if pages[-1] and (len(pages[-1]) >= SHOP_PAGE_SIZE or used + size > budget):
+            pages.append([])
+            used = 0
+        pages[-1].append(field)
+        used += size
+    shop_page_cache[(shop_key, sort, item_filter)] = (version, currency_symbol, expiry, pages)
+    return pages
+
+def build_shop_page(shop_key: str, sort: str, item_filter: str, page: int):
+    """Return the embed and button view for one catalog page"""
+    shop_info = shops_data[shop_key]
+    pages = get_shop_pages(shop_key, sort, item_filter)
+    page = max(0, min(page, len(pages) - 1))
+    
+    embed = discord.Embed(title=f"{shop_info['name']} - Items", description=shop_info["description"], color=DEFAULT_EMBED_COLOR)
+    for name, value in pages[page]:
+        embed.add_field(name=name, value=value, inline=False)
+    if not pages[page]:
+        embed.add_field(name="No items", value="Nothing matches this filter.", inline=False)
+    embed.set_footer(text=f"Page {page + 1}/{len(pages)} • Sorted by {SHOP_SORTS[sort][0]} • {SHOP_FILTERS[item_filter][0]}")
+    
+    shop_id = catalog.register_shop(shop_key)
+    sorts = list(SHOP_SORTS)
+    next_sort = sorts[(sorts.index(sort) + 1) % len(sorts)]
+    view = discord.ui.View(timeout=None)
+    view.add_item(ShopPageButton("prev", shop_id, sort, item_filter, page - 1, disabled=page == 0))
+    view.add_item(ShopPageButton("next", shop_id, sort, item_filter, page + 1, disabled=page >= len(pages) - 1))
+    view.add_item(ShopPageButton("sort", shop_id, next_sort, item_filter, 0))
+    return embed, view
+
+class ShopPageButton(discord.ui.DynamicItem[discord.ui.Button], template=r"shop:(?P<action>prev|next|sort):(?P<shop_id>[0-9]+):(?P<sort>[a-z]+):(?P<filter>[a-z]+):(?P<page>-?[0-9]+)"):
+    """Catalog navigation button, the target page is encoded in the custom ID so it survives restarts"""
+
+    def __init__(self, action: str, shop_id: int, sort: str, item_filter: str, page: int, disabled: bool = False):
+        labels = {"prev": "Previous", "next": "Next", "sort": f"Sort: {SHOP_SORTS.get(sort, ('?',))[0]}"}
+        super().__init__(discord.ui.Button(
+            label=labels[action],
+            style=discord.ButtonStyle.gray,
+            custom_id=f"shop:{action}:{shop_id}:{sort}:{item_filter}:{page}",
+            disabled=disabled
+        ))
+        self.shop_id = shop_id
+        self.sort = sort
+        self.item_filter = item_filter
+        self.page = page
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match["action"], int(match["shop_id"]), match["sort"], match["filter"], int(match["page"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        shop_key = catalog.shop_key(self.shop_id)
+        if shop_key not in shops_data or self.sort not in SHOP_SORTS or self.item_filter not in SHOP_FILTERS:
+            await interaction.response.send_message("This shop no longer exists.", ephemeral=True)
+            return
+        embed, view = build_shop_page(shop_key, self.sort, self.item_filter, self.page)
+        await interaction.response.edit_message(embed=embed, view=view)
+
 @tree.command(name="shop_list", description="List all shops or items in a specific shop", guild=discord.Object(id=GUILD_ID))
 @guild_only()
-@app_commands.describe(shop_name="Name of specific shop (optional)")
-async def shop_list(interaction: discord.Interaction, shop_name: str = None):
-    currency_symbol = get_currency_symbol()
-    
+@app_commands.describe(shop_name="Name of specific shop (optional)", sort="How to sort the items", item_filter="Which items to show")
+@app_commands.choices(
+    sort=[app_commands.Choice(name=label, value=key) for key, (label, _) in SHOP_SORTS.items()],
+    item_filter=[app_commands.Choice(name=label, value=key) for key, (label, _) in SHOP_FILTERS.items()]
+)
+@app_commands.autocomplete(shop_name=shop_autocomplete)
+async def shop_list(interaction: discord.Interaction, shop_name: str = None, sort: app_commands.Choice[str] = None, item_filter: app_commands.Choice[str] = None):
     if shop_name is None:
         # List all shops
         if not shops_data:
@@ -701,16 +2442,18 @@ async def shop_list(interaction: discord.Interaction, shop_name: str = None):
             return
         
         embed = discord.Embed(title="Available Shops", color=DEFAULT_EMBED_COLOR)
-        for shop_key, shop_info in shops_data.items():
+        for shop_key, shop_info in itertools.islice(shops_data.items(), 25):
             embed.add_field(
                 name=shop_info["name"],
                 value=shop_info["description"],
                 inline=False
             )
+        if len(shops_data) > 25:
+            embed.set_footer(text=f"Showing 25 of {len(shops_data)} shops")
         await interaction.response.send_message(embed=embed)
     else:
         # List items in specific shop
-        shop_key = shop_name.lower().replace(" ", "_")
+        shop_key = normalize_key(shop_name)
         if shop_key not in shops_data:
             await interaction.response.send_message("Shop not found.")
             return
@@ -720,29 +2463,124 @@ async def shop_list(interaction: discord.Interaction, shop_name: str = None):
             await interaction.response.send_message(f"The {shop_info['name']} shop is currently empty.")
             return
         
-        embed = discord.Embed(title=f"{shop_info['name']} - Items", color=DEFAULT_EMBED_COLOR)
-        for item_key, item_info in shop_info["items"].items():
-            original_price = item_info["price"]
-            discount = item_info.get("discount", 0)
-            final_price = original_price * (100 - discount) // 100
+        embed, view = build_shop_page(shop_key, sort.value if sort else "price", item_filter.value if item_filter else "all", 0)
+        await interaction.response.send_message(embed=embed, view=view)
+
+# --------- Shop Purchases -----------
+
+def is_limited(item_info: dict):
+    return item_info.get("stock") is not None or bool(item_info.get("sale_start") or item_info.get("sale_end"))
+
+def get_unavailable_reason(item_info: dict):
+    """Return why an item can't be bought right now, or None"""
+    now = time.time()
+    if item_info.get("sale_start") and now < item_info["sale_start"]:
+        return f"{item_info['name']} goes on sale <t:{item_info['sale_start']}:R>."
+    if item_info.get("sale_end") and now >= item_info["sale_end"]:
+        return f"The sale for {item_info['name']} has ended."
+    if item_info.get("stock") is not None and item_info["stock"] <= 0:
+        return f"{item_info['name']} is sold out."
+    return None
+
+def describe_availability(item_info: dict):
+    parts = []
+    if item_info.get("stock") is not None:
+        parts.append(f"📦 {item_info['stock']} left" if item_info["stock"] > 0 else "📦 Sold out")
+    if item_info.get("sale_start") and item_info["sale_start"] > time.time():
+        parts.append(f"⏰ On sale <t:{item_info['sale_start']}:R>")
+    if item_info.get("sale_end"):
+        if item_info["sale_end"] > time.time():
+            parts.append(f"⏳ Sale ends <t:{item_info['sale_end']}:R>")
+        else:
+            parts.append("⏳ Sale ended")
+    return " • ".join(parts)
+
+async def purchase_item(user_id: str, shop_key: str, item_key: str, queued: bool = False):
+    """Buy one item for a user, returns (success, reply). The caller persists the result.
+
+    Limited items may only be bought from the purchase queue; a direct call for one
+    returns None so the caller can resubmit it there.
+    """
+    currency_symbol = get_currency_symbol()
+    async with lock_users(user_id):
+        # Everything is read under the lock, the item may have changed while it was awaited
+        item_info = shops_data.get(shop_key, {}).get("items", {}).get(item_key)
+        if not item_info:
+            return False, "Shop or item not found."
+        if is_limited(item_info) and not queued:
+            return None
+        
+        reason = get_unavailable_reason(item_info)
+        if reason:
+            return False, reason
+        
+        final_price = get_final_price(item_info)
+        settle_income(user_id)
+        bal = user_balances.get(user_id, 0)
+        if bal < final_price:
+            return False, f"You need {currency_symbol}{final_price - bal} more to buy this item."
+        
+        ledger.post(user_id, -final_price, "shop_buy", f"{shop_key}/{item_key}")
+        inventory_add(user_id, catalog.register_item(shop_key, item_key))
+        if item_info.get("stock") is not None:
+            item_info["stock"] = max(0, item_info["stock"] - 1)
+            bump_shop_version(shop_key)
+    
+    shop_index.touch(shop_key)
+    item_indexes[shop_key].touch(item_key)
+    return True, f"<@{user_id}> bought {item_info['name']} for {currency_symbol}{final_price}!"
+
+class PurchaseQueue:
+    """Single consumer for limited-stock and sale-window purchases.
+
+    Buyers are answered in arrival order by one task, so stock can't be oversold.
+    Everything waiting in the queue is processed as one batch and persisted with a
+    single save before the buyers are answered.
+    """
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.task = None
+
+    def start(self):
+        if self.task and not self.task.done():
+            return
+        self.task = asyncio.create_task(self._run())
+
+    async def submit(self, user_id: str, shop_key: str, item_key: str):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((user_id, shop_key, item_key, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
             
-            price_text = f"{currency_symbol}{final_price}"
-            if discount > 0:
-                price_text += f" ~~{currency_symbol}{original_price}~~ ({discount}% off)"
+            results = []
+            for user_id, shop_key, item_key, future in batch:
+                try:
+                    results.append((future, await purchase_item(user_id, shop_key, item_key, queued=True)))
+                except Exception as e:
+                    print(f"Purchase of {shop_key}/{item_key} for {user_id} failed: {e}")
+                    results.append((future, (False, "Something went wrong with your purchase, please try again.")))
             
-            embed.add_field(
-                name=f"{item_info['name']} - {price_text}",
-                value=item_info["description"],
-                inline=False
-            )
-        await interaction.response.send_message(embed=embed)
+            if any(success for _, (success, _) in results):
+                save_all()
+            for future, result in results:
+                if not future.done():
+                    future.set_result(result)
+
+purchase_queue = PurchaseQueue()
 
 @tree.command(name="shop_buy", description="Buy an item from a shop", guild=discord.Object(id=GUILD_ID))
 @guild_only()
 @app_commands.describe(shop_name="Name of the shop", item="Item name")
+@app_commands.autocomplete(shop_name=shop_autocomplete, item=item_autocomplete("shop_name"))
 async def shop_buy(interaction: discord.Interaction, shop_name: str, item: str):
-    shop_key = shop_name.lower().replace(" ", "_")
-    item_key = item.lower().replace(" ", "_")
+    shop_key = normalize_key(shop_name)
+    item_key = normalize_key(item)
     uid = str(interaction.user.id)
     ensure_user_in_stats(uid)
 
@@ -750,28 +2588,22 @@ async def shop_buy(interaction: discord.Interaction, shop_name: str, item: str):
         await interaction.response.send_message("Shop or item not found.")
         return
 
-    item_info = shops_data[shop_key]["items"][item_key]
-    original_price = item_info["price"]
-    discount = item_info.get("discount", 0)
-    final_price = original_price * (100 - discount) // 100
-    bal = user_balances.get(uid, 0)
-    currency_symbol = get_currency_symbol()
-
-    if bal < final_price:
-        await interaction.response.send_message(f"You need {currency_symbol}{final_price - bal} more to buy this item.")
-        return
-
-    user_balances[uid] = bal - final_price
+    result = None
+    if not is_limited(shops_data[shop_key]["items"][item_key]):
+        result = await purchase_item(uid, shop_key, item_key)
     
-    # Add to inventory
-    if shop_key not in user_inventories[uid]:
-        user_inventories[uid][shop_key] = {}
-    if item_key not in user_inventories[uid][shop_key]:
-        user_inventories[uid][shop_key][item_key] = 0
-    user_inventories[uid][shop_key][item_key] += 1
+    if result is None:
+        # Limited items, including ones that became limited while the lock was awaited,
+        # go through the purchase queue and are answered as a followup
+        await interaction.response.defer()
+        success, reply = await purchase_queue.submit(uid, shop_key, item_key)
+        await interaction.followup.send(reply)
+        return
     
-    save_all()
-    await interaction.response.send_message(f"{interaction.user.mention} bought {item_info['name']} for {currency_symbol}{final_price}!")
+    success, reply = result
+    if success:
+        save_all()
+    await interaction.response.send_message(reply)
 
 # --------- Inventory and Trading -----------
 
@@ -787,17 +2619,15 @@ async def inventory(interaction: discord.Interaction):
     
     embed = discord.Embed(title=f"{interaction.user.display_name}'s Inventory", color=DEFAULT_EMBED_COLOR)
     
-    for shop_key, items in user_inventories[uid].items():
-        if shop_key in shops_data:
-            shop_name = shops_data[shop_key]["name"]
-            item_list = []
-            for item_key, quantity in items.items():
-                if item_key in shops_data[shop_key]["items"]:
-                    item_name = shops_data[shop_key]["items"][item_key]["name"]
-                    item_list.append(f"{item_name} x{quantity}")
-            
-            if item_list:
-                embed.add_field(name=shop_name, value="\n".join(item_list), inline=False)
+    # Group items by shop in a single pass, skipping items that no longer exist
+    shop_items = {}
+    for item_id, quantity in user_inventories[uid].items():
+        shop_info, item_info = catalog.item_info(item_id)
+        if item_info:
+            shop_items.setdefault(shop_info["name"], []).append(f"{item_info['name']} x{quantity}")
+    
+    for shop_name, item_list in shop_items.items():
+        embed.add_field(name=shop_name, value="\n".join(item_list), inline=False)
     
     await interaction.response.send_message(embed=embed)
 
@@ -809,142 +2639,258 @@ async def inventory(interaction: discord.Interaction):
     item="Item name",
     quantity="Quantity to gift"
 )
+@app_commands.autocomplete(shop_name=shop_autocomplete, item=item_autocomplete("shop_name"))
 async def gift(interaction: discord.Interaction, user: discord.Member, shop_name: str, item: str, quantity: int = 1):
     if quantity <= 0:
         await interaction.response.send_message("Quantity must be positive.")
         return
     
-    shop_key = shop_name.lower().replace(" ", "_")
-    item_key = item.lower().replace(" ", "_")
+    shop_key = normalize_key(shop_name)
+    item_key = normalize_key(item)
     giver_id = str(interaction.user.id)
     receiver_id = str(user.id)
     
     ensure_user_in_stats(giver_id)
     ensure_user_in_stats(receiver_id)
     
-    # Check if giver has the item
-    if (shop_key not in user_inventories[giver_id] or 
-        item_key not in user_inventories[giver_id][shop_key] or
-        user_inventories[giver_id][shop_key][item_key] < quantity):
+    item_id = catalog.item_ids.get((shop_key, item_key))
+    async with lock_users(giver_id, receiver_id):
+        # Transfer items if the giver has enough
+        transferred = inventory_remove(giver_id, item_id, quantity)
+        if transferred:
+            inventory_add(receiver_id, item_id, quantity)
+            save_all()
+    
+    if not transferred:
         await interaction.response.send_message("You don't have enough of this item to gift.")
         return
     
-    # Transfer items
-    user_inventories[giver_id][shop_key][item_key] -= quantity
-    if user_inventories[giver_id][shop_key][item_key] == 0:
-        del user_inventories[giver_id][shop_key][item_key]
-    
-    if shop_key not in user_inventories[receiver_id]:
-        user_inventories[receiver_id][shop_key] = {}
-    if item_key not in user_inventories[receiver_id][shop_key]:
-        user_inventories[receiver_id][shop_key][item_key] = 0
-    user_inventories[receiver_id][shop_key][item_key] += quantity
-    
-    save_all()
-    
     item_name = shops_data[shop_key]["items"][item_key]["name"] if shop_key in shops_data and item_key in shops_data[shop_key]["items"] else item
     await interaction.response.send_message(f"{interaction.user.mention} gifted {quantity}x {item_name} to {user.mention}!")
 
-@tree.command(name="trade", description="Trade items with another user", guild=discord.Object(id=GUILD_ID))
+# --------- Trades -----------
+
+trades_data = load_json("trades.json")  # trade_id -> trade, offered items are held in escrow while pending
+
+# Trade message ID -> trade ID, used by the persistent TradeView
+trade_message_index = {
+    trade["message_id"]: trade_id
+    for trade_id, trade in trades_data.items()
+    if trade["status"] == "pending" and trade.get("message_id")
+}
+
+TRADE_ITEM_RE = re.compile(r"^(?P<shop>[^/]+)/(?P<item>.+?)(?:\s+x\s*(?P<quantity>\d+))?$", re.IGNORECASE)
+
+def parse_trade_items(text: str):
+    """Parse "shop/item x2, shop/other item" into [[item_id, quantity], ...], or return an error message"""
+    items = {}
+    for part in re.split(r"[,;]", text or ""):
+        part = part.strip()
+        if not part:
+            continue
+        match = TRADE_ITEM_RE.match(part)
+        if not match:
+            return f"Couldn't read `{part}`, use `shop/item x2`."
+        item_id = catalog.item_ids.get((normalize_key(match["shop"].strip()), normalize_key(match["item"].strip())))
+        if item_id is None:
+            return f"Item `{part}` not found."
+        quantity = int(match["quantity"] or 1)
+        if quantity < 1:
+            return f"Quantity for `{part}` must be at least 1."
+        items[item_id] = items.get(item_id, 0) + quantity
+    return [[item_id, quantity] for item_id, quantity in items.items()]
+
+def describe_trade_side(items: list, currency: int):
+    lines = []
+    for item_id, quantity in items:
+        _, item_info = catalog.item_info(item_id)
+        lines.append(f"{quantity}x {item_info['name'] if item_info else catalog.items[item_id][1]}")
+    if currency:
+        lines.append(f"{get_currency_symbol()}{currency}")
+    return "\n".join(lines) or "Nothing"
+
+def has_trade_side(user_id: str, items: list, currency: int):
+    return user_balances.get(user_id, 0) >= currency and all(inventory_qty(user_id, item_id) >= quantity for item_id, quantity in items)
+
+def take_trade_side(user_id: str, items: list, currency: int, reason: str, trade_id: str):
+    for item_id, quantity in items:
+        inventory_remove(user_id, item_id, quantity)
+    if currency:
+        ledger.post(user_id, -currency, reason, trade_id)
+
+def give_trade_side(user_id: str, items: list, currency: int, reason: str, trade_id: str):
+    for item_id, quantity in items:
+        inventory_add(user_id, item_id, quantity)
+    if currency:
+        ledger.post(user_id, currency, reason, trade_id)
+
+def build_trade_embed(trade: dict):
+    titles = {
+        "pending": ("Trade Offer", DEFAULT_EMBED_COLOR),
+        "completed": ("Trade Completed!", 0x00FF00),
+        "declined": ("Trade Declined", 0xFF0000),
+        "cancelled": ("Trade Cancelled", 0xFF0000),
+        "expired": ("Trade Expired", 0x808080),
+    }
+    title, color = titles[trade["status"]]
+    embed = discord.Embed(title=title, color=color)
+    embed.add_field(name="Trader 1", value=f"<@{trade['proposer_id']}>\nGiving:\n{describe_trade_side(trade['offer_items'], trade['offer_currency'])}", inline=True)
+    embed.add_field(name="Trader 2", value=f"<@{trade['partner_id']}>\nGiving:\n{describe_trade_side(trade['request_items'], trade['request_currency'])}", inline=True)
+    if trade["status"] == "pending":
+        embed.add_field(name="Expires", value=f"<t:{trade['expires_at']}:R>", inline=False)
+    embed.set_footer(text=f"Trade ID: {trade['id']}")
+    return embed
+
+async def close_trade(trade_id: str, status: str):
+    """Close a pending trade without completing it and return the escrow to the proposer"""
+    trade = trades_data[trade_id]
+    async with lock_users(trade["proposer_id"]):
+        if trade["status"] != "pending":
+            return False
+        give_trade_side(trade["proposer_id"], trade["offer_items"], trade["offer_currency"], "trade_refund", trade_id)
+        trade["status"] = status
+        save_all()
+        save_json("trades.json", trades_data)
+    trade_message_index.pop(trade.get("message_id"), None)
+    scheduler.cancel(f"trade:{trade_id}")
+    return True
+
+class TradeView(discord.ui.View):
+    def __init__(self):
+        super().__init__(timeout=None)
+
+    def get_trade(self, interaction: discord.Interaction):
+        trade_id = trade_message_index.get(interaction.message.id)
+        return trade_id, trades_data.get(trade_id)
+
+    @discord.ui.button(label="Accept", style=discord.ButtonStyle.success, custom_id="trade:accept")
+    async def accept(self, interaction: discord.Interaction, button: discord.ui.Button):
+        trade_id, trade = self.get_trade(interaction)
+        if not trade or trade["status"] != "pending":
+            await interaction.response.send_message("This trade is no longer open.", ephemeral=True)
+            return
+        if str(interaction.user.id) != trade["partner_id"]:
+            await interaction.response.send_message("Only the trade partner can accept this trade.", ephemeral=True)
+            return
+        
+        proposer_id, partner_id = trade["proposer_id"], trade["partner_id"]
+        error = None
+        async with lock_users(proposer_id, partner_id):
+            settle_income(partner_id, get_member_role_ids(interaction.user))
+            if trade["status"] != "pending":
+                error = "This trade is no longer open."
+            elif not has_trade_side(partner_id, trade["request_items"], trade["request_currency"]):
+                error = "You no longer have everything this trade asks for."
+            else:
+                # The proposer's side is already in escrow
+                take_trade_side(partner_id, trade["request_items"], trade["request_currency"], "trade", trade_id)
+                give_trade_side(partner_id, trade["offer_items"], trade["offer_currency"], "trade", trade_id)
+                give_trade_side(proposer_id, trade["request_items"], trade["request_currency"], "trade", trade_id)
+                trade["status"] = "completed"
+                save_all()
+                save_json("trades.json", trades_data)
+        
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
+            return
+        
+        trade_message_index.pop(interaction.message.id, None)
+        scheduler.cancel(f"trade:{trade_id}")
+        await interaction.response.edit_message(embed=build_trade_embed(trade), view=None)
+
+    @discord.ui.button(label="Decline", style=discord.ButtonStyle.danger, custom_id="trade:decline")
+    async def decline(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.close(interaction, "partner_id", "declined")
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.secondary, custom_id="trade:cancel")
+    async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.close(interaction, "proposer_id", "cancelled")
+
+    async def close(self, interaction: discord.Interaction, allowed: str, status: str):
+        trade_id, trade = self.get_trade(interaction)
+        if not trade or trade["status"] != "pending":
+            await interaction.response.send_message("This trade is no longer open.", ephemeral=True)
+            return
+        if str(interaction.user.id) != trade[allowed]:
+            action = "decline" if status == "declined" else "cancel"
+            await interaction.response.send_message(f"You can't {action} this trade.", ephemeral=True)
+            return
+        
+        if await close_trade(trade_id, status):
+            await interaction.response.edit_message(embed=build_trade_embed(trade), view=None)
+        else:
+            await interaction.response.send_message("This trade is no longer open.", ephemeral=True)
+
+@tree.command(name="trade", description="Offer items and currency to another user in exchange for theirs", guild=discord.Object(id=GUILD_ID))
 @guild_only()
 @app_commands.describe(
     user="User to trade with",
-    your_shop="Your shop name",
-    your_item="Your item name",
-    your_quantity="Your quantity",
-    their_shop="Their shop name", 
-    their_item="Their item name",
-    their_quantity="Their quantity"
+    offer="Items you give, e.g. Gems/Red Gem x2, Gems/Blue Gem",
+    request="Items you want from them, same format",
+    offer_currency="Currency you give",
+    request_currency="Currency you want from them"
 )
-async def trade(interaction: discord.Interaction, user: discord.Member, your_shop: str, your_item: str, your_quantity: int, their_shop: str, their_item: str, their_quantity: int):
-    if your_quantity <= 0 or their_quantity <= 0:
-        await interaction.response.send_message("Quantities must be positive.")
+async def trade(interaction: discord.Interaction, user: discord.Member, offer: str = None, request: str = None, offer_currency: app_commands.Range[int, 0] = 0, request_currency: app_commands.Range[int, 0] = 0):
+    if user.bot or user.id == interaction.user.id:
+        await interaction.response.send_message("You can't trade with that user.", ephemeral=True)
         return
     
-    trader1_id = str(interaction.user.id)
-    trader2_id = str(user.id)
-    
-    ensure_user_in_stats(trader1_id)
-    ensure_user_in_stats(trader2_id)
-    
-    your_shop_key = your_shop.lower().replace(" ", "_")
-    your_item_key = your_item.lower().replace(" ", "_")
-    their_shop_key = their_shop.lower().replace(" ", "_")
-    their_item_key = their_item.lower().replace(" ", "_")
-    
-    # Check if both users have their respective items
-    if (your_shop_key not in user_inventories[trader1_id] or 
-        your_item_key not in user_inventories[trader1_id][your_shop_key] or
-        user_inventories[trader1_id][your_shop_key][your_item_key] < your_quantity):
-        await interaction.response.send_message("You don't have enough of the item you're trying to trade.")
+    offer_items = parse_trade_items(offer)
+    request_items = parse_trade_items(request)
+    for parsed in (offer_items, request_items):
+        if isinstance(parsed, str):
+            await interaction.response.send_message(parsed, ephemeral=True)
+            return
+    if not (offer_items or offer_currency or request_items or request_currency):
+        await interaction.response.send_message("A trade needs something on at least one side.", ephemeral=True)
         return
     
-    if (their_shop_key not in user_inventories[trader2_id] or 
-        their_item_key not in user_inventories[trader2_id][their_shop_key] or
-        user_inventories[trader2_id][their_shop_key][their_item_key] < their_quantity):
-        await interaction.response.send_message(f"{user.mention} doesn't have enough of the item you want.")
+    proposer_id = str(interaction.user.id)
+    partner_id = str(user.id)
+    ensure_user_in_stats(proposer_id)
+    ensure_user_in_stats(partner_id)
+    
+    # Checked again when the partner accepts
+    if not has_trade_side(partner_id, request_items, request_currency):
+        await interaction.response.send_message(f"{user.mention} doesn't have everything you're asking for.", ephemeral=True)
         return
     
-    # Create confirmation message
-    embed = discord.Embed(title="Trade Confirmation", color=DEFAULT_EMBED_COLOR)
-    embed.add_field(name="Trader 1", value=f"{interaction.user.mention}\nGiving: {your_quantity}x {your_item}", inline=True)
-    embed.add_field(name="Trader 2", value=f"{user.mention}\nGiving: {their_quantity}x {their_item}", inline=True)
-    embed.add_field(name="Instructions", value=f"{user.mention}, react with ✅ to accept this trade or ❌ to decline.", inline=False)
+    import uuid
+    trade_id = str(uuid.uuid4())
+    trade = None
+    async with lock_users(proposer_id):
+        settle_income(proposer_id, get_member_role_ids(interaction.user))
+        if has_trade_side(proposer_id, offer_items, offer_currency):
+            # Hold the proposer's side in escrow until the trade closes
+            take_trade_side(proposer_id, offer_items, offer_currency, "trade_escrow", trade_id)
+            trade = trades_data[trade_id] = {
+                "id": trade_id,
+                "proposer_id": proposer_id,
+                "partner_id": partner_id,
+                "offer_items": offer_items,
+                "offer_currency": offer_currency,
+                "request_items": request_items,
+                "request_currency": request_currency,
+                "status": "pending",
+                "created_at": int(time.time()),
+                "expires_at": int(time.time()) + TRADE_EXPIRY_MINUTES * 60,
+                "channel_id": interaction.channel_id,
+                "message_id": None
+            }
+            save_all()
+            save_json("trades.json", trades_data)
     
-    message = await interaction.response.send_message(embed=embed)
-    await message.add_reaction("✅")
-    await message.add_reaction("❌")
+    if trade is None:
+        await interaction.response.send_message("You don't have everything you're offering.", ephemeral=True)
+        return
     
-    def check(reaction, reaction_user):
-        return (reaction_user == user and 
-                str(reaction.emoji) in ["✅", "❌"] and 
-                reaction.message.id == message.id)
+    scheduler.schedule(f"trade:{trade_id}", trade["expires_at"], "trade_expire", trade_id)
     
-    try:
-        reaction, reaction_user = await bot.wait_for("reaction_add", timeout=60.0, check=check)
-        
-        if str(reaction.emoji) == "✅":
-            # Execute trade
-            # Remove items from both users
-            user_inventories[trader1_id][your_shop_key][your_item_key] -= your_quantity
-            user_inventories[trader2_id][their_shop_key][their_item_key] -= their_quantity
-            
-            # Add items to both users
-            if their_shop_key not in user_inventories[trader1_id]:
-                user_inventories[trader1_id][their_shop_key] = {}
-            if their_item_key not in user_inventories[trader1_id][their_shop_key]:
-                user_inventories[trader1_id][their_shop_key][their_item_key] = 0
-            user_inventories[trader1_id][their_shop_key][their_item_key] += their_quantity
-            
-            if your_shop_key not in user_inventories[trader2_id]:
-                user_inventories[trader2_id][your_shop_key] = {}
-            if your_item_key not in user_inventories[trader2_id][your_shop_key]:
-                user_inventories[trader2_id][your_shop_key][your_item_key] = 0
-            user_inventories[trader2_id][your_shop_key][your_item_key] += your_quantity
-            
-            # Clean up empty entries
-            if user_inventories[trader1_id][your_shop_key][your_item_key] == 0:
-                del user_inventories[trader1_id][your_shop_key][your_item_key]
-            if user_inventories[trader2_id][their_shop_key][their_item_key] == 0:
-                del user_inventories[trader2_id][their_shop_key][their_item_key]
-            
-            save_all()
-            
-            embed.color = 0x00FF00
-            embed.clear_fields()
-            embed.add_field(name="Trade Completed!", value="Both users have received their items.", inline=False)
-            await message.edit(embed=embed)
-        else:
-            embed.color = 0xFF0000
-            embed.clear_fields()
-            embed.add_field(name="Trade Declined", value="The trade has been declined.", inline=False)
-            await message.edit(embed=embed)
-            
-    except asyncio.TimeoutError:
-        embed.color = 0x808080
-        embed.clear_fields()
-        embed.add_field(name="Trade Expired", value="The trade request has timed out.", inline=False)
-        await message.edit(embed=embed)
+    await interaction.response.send_message(content=user.mention, embed=build_trade_embed(trade), view=TradeView())
+    message = await interaction.original_response()
+    trade["message_id"] = message.id
+    trade_message_index[message.id] = trade_id
+    save_json("trades.json", trades_data)
 
 # --------- User Profile Commands -----------
 
@@ -1030,9 +2976,31 @@ async def profile(interaction: discord.Interaction, bio: str = None, embed_color
 async def balance(interaction: discord.Interaction):
     uid = str(interaction.user.id)
     ensure_user_in_stats(uid)
+    async with lock_users(uid):
+        settle_income(uid, get_member_role_ids(interaction.user))
     bal = user_balances.get(uid, 0)
     currency_symbol = get_currency_symbol()
-    await interaction.response.send_message(f"{interaction.user.mention}'s balance: {currency_symbol}{bal}")
+    worth = net_worth.get(uid)
+    await interaction.response.send_message(f"{interaction.user.mention}'s balance: {currency_symbol}{bal}\nNet worth: {currency_symbol}{worth} (rank #{net_worth.rank(uid)})")
+
+@tree.command(name="networth_leaderboard", description="Show the richest members by balance plus inventory value", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+@app_commands.describe(page="Leaderboard page")
+async def networth_leaderboard(interaction: discord.Interaction, page: app_commands.Range[int, 1] = 1):
+    currency_symbol = get_currency_symbol()
+    entries = net_worth.top((page - 1) * 10, 10)
+    if not entries:
+        await interaction.response.send_message("No one is on this page of the leaderboard.", ephemeral=True)
+        return
+    
+    embed = discord.Embed(title="Net Worth Leaderboard", color=DEFAULT_EMBED_COLOR)
+    embed.description = "\n".join(
+        f"**{rank}.** <@{user_id}> - {currency_symbol}{worth}"
+        for rank, (user_id, worth) in enumerate(entries, start=(page - 1) * 10 + 1)
+    )
+    total_pages = max(1, (len(net_worth.ranking) + 9) // 10)
+    embed.set_footer(text=f"Page {page}/{total_pages} • Balance plus inventory at current shop prices")
+    await interaction.response.send_message(embed=embed)
 
 @tree.command(name="balance_give", description="Give currency to a user", guild=discord.Object(id=GUILD_ID))
 @guild_only()
@@ -1048,8 +3016,8 @@ async def balance_give(interaction: discord.Interaction, user: discord.Member, a
     
     uid = str(user.id)
     ensure_user_in_stats(uid)
-    user_balances[uid] += amount
-    save_json("balances.json", user_balances)
+    async with lock_users(uid):
+        ledger.post(uid, amount, "staff_give", str(interaction.user.id))
     currency_symbol = get_currency_symbol()
     await interaction.response.send_message(f"Gave {currency_symbol}{amount} to {user.mention}")
 
@@ -1067,11 +3035,150 @@ async def balance_remove(interaction: discord.Interaction, user: discord.Member,
     
     uid = str(user.id)
     ensure_user_in_stats(uid)
-    user_balances[uid] = max(0, user_balances[uid] - amount)
-    save_json("balances.json", user_balances)
+    async with lock_users(uid):
+        settle_income(uid)
+        amount = min(amount, user_balances[uid])  # Balances never go below zero
+        if amount:
+            ledger.post(uid, -amount, "staff_remove", str(interaction.user.id))
     currency_symbol = get_currency_symbol()
     await interaction.response.send_message(f"Removed {currency_symbol}{amount} from {user.mention}")
 
+@tree.command(name="income_set", description="Set how much currency a role earns per day (0 to remove)", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+@app_commands.describe(role="Role that earns income", amount_per_day="Currency per day, 0 removes the income")
+async def income_set(interaction: discord.Interaction, role: discord.Role, amount_per_day: app_commands.Range[int, 0]):
+    if not has_staff_role(interaction):
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+        return
+    
+    # Settling a large role can take a while
+    await interaction.response.defer()
+    
+    # Settle current holders at the old rate so the change only applies going forward
+    for member in role.members:
+        settle_income(str(member.id), get_member_role_ids(member))
+    
+    rules = server_settings.setdefault("income_rules", {})
+    if amount_per_day:
+        rules[str(role.id)] = amount_per_day
+    else:
+        rules.pop(str(role.id), None)
+    save_json("server_settings.json", server_settings)
+    for member in role.members:
+        settle_income(str(member.id), get_member_role_ids(member))
+    save_income_accruals()
+    
+    currency_symbol = get_currency_symbol()
+    rule_lines = [f"<@&{role_id}> - {currency_symbol}{amount}/day" for role_id, amount in rules.items()]
+    embed = discord.Embed(title="Role Income", description="\n".join(rule_lines) or "No roles earn income.", color=DEFAULT_EMBED_COLOR)
+    await interaction.followup.send(embed=embed)
+
+USER_ID_RE = re.compile(r"<@!?(\d{15,21})>|\b(\d{15,21})\b")
+
+@tree.command(name="bulk_grant", description="Grant or remove currency or XP for many members at once", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+@app_commands.describe(
+    resource="What to grant or remove",
+    action="Grant or remove",
+    amount="Amount per member",
+    role="Everyone with this role",
+    members="Mentions or user IDs separated by spaces",
+    giveaway_id="Everyone who joined this giveaway"
+)
+@app_commands.choices(
+    resource=[
+        app_commands.Choice(name="Currency", value="currency"),
+        app_commands.Choice(name="XP", value="xp"),
+    ],
+    action=[
+        app_commands.Choice(name="Grant", value="grant"),
+        app_commands.Choice(name="Remove", value="remove"),
+    ]
+)
+@app_commands.autocomplete(giveaway_id=giveaway_autocomplete)
+async def bulk_grant(interaction: discord.Interaction, resource: app_commands.Choice[str], action: app_commands.Choice[str], amount: app_commands.Range[int, 1], role: discord.Role = None, members: str = None, giveaway_id: str = None):
+    if not has_staff_role(interaction):
+        await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
+        return
+    
+    if giveaway_id and giveaway_id not in giveaways_data:
+        await interaction.response.send_message("Giveaway not found.", ephemeral=True)
+        return
+    
+    # Collect every targeted user once
+    user_ids = set()
+    if role:
+        user_ids.update(str(member.id) for member in role.members if not member.bot)
+    if members:
+        user_ids.update(mention or raw_id for mention, raw_id in USER_ID_RE.findall(members))
+    if giveaway_id:
+        user_ids.update(str(user_id) for user_id in giveaway_participants.get(giveaway_id).user_ids)
+    
+    if not user_ids:
+        await interaction.response.send_message("No members matched. Provide a role, member mentions or a giveaway ID.", ephemeral=True)
+        return
+    
+    for user_id in user_ids:
+        ensure_user_in_stats(user_id)
+    
+    # Apply the whole batch, then persist once
+    sign = 1 if action.value == "grant" else -1
+    if resource.value == "currency":
+        async with lock_users(*user_ids):
+            # Removals are capped so balances never go below zero, counting income already owed
+            if sign < 0:
+                for user_id in user_ids:
+                    settle_income(user_id)
+            changes = [(user_id, sign * (amount if sign > 0 else min(amount, user_balances[user_id])), f"bulk_{action.value}", str(interaction.user.id)) for user_id in user_ids]
+            changes = [change for change in changes if change[1]]
+            if changes:
+                ledger.post_many(changes)
+        total = sum(abs(change[1]) for change in changes)
+        amount_text = f"{get_currency_symbol()}{total}"
+    else:
+        total = 0
+        for user_id in user_ids:
+            stats = member_stats[user_id]
+            delta = amount if sign > 0 else min(amount, stats["xp"])
+            stats["xp"] += sign * delta
+            total += delta
+        save_json("member_stats.json", member_stats)
+        amount_text = f"{total} XP"
+    
+    embed = discord.Embed(title="Bulk Grant Complete" if sign > 0 else "Bulk Removal Complete", color=DEFAULT_EMBED_COLOR)
+    embed.add_field(name="Members", value=str(len(user_ids)), inline=True)
+    embed.add_field(name="Per Member", value=f"{get_currency_symbol()}{amount}" if resource.value == "currency" else f"{amount} XP", inline=True)
+    embed.add_field(name="Total " + ("Granted" if sign > 0 else "Removed"), value=amount_text, inline=True)
+    await interaction.response.send_message(embed=embed)
+    await log_action("moderation", f"📦 **Bulk {action.name}**\n**Staff:** {interaction.user.mention}\n**Resource:** {resource.name}\n**Members:** {len(user_ids)}\n**Total:** {amount_text}")
+
+def build_transactions_embed(user_id: str, page: int):
+    entries, total = ledger.history(user_id, page * 10, 10)
+    currency_symbol = get_currency_symbol()
+    embed = discord.Embed(title="Transaction History", color=DEFAULT_EMBED_COLOR)
+    lines = []
+    for entry in entries:
+        sign = "+" if entry["delta"] >= 0 else "-"
+        reason = entry["reason"].replace("_", " ").title()
+        # Income refs are the settled-up-to time used for recovery, not worth showing
+        ref = f" ({entry['ref']})" if entry.get("ref") and entry["reason"] != "income" else ""
+        lines.append(f"<t:{entry['ts']}:d> `{sign}{currency_symbol}{abs(entry['delta'])}` {reason}{ref}")
+    embed.description = f"<@{user_id}>\n\n" + ("\n".join(lines) or "No transactions yet.")
+    embed.set_footer(text=f"Page {page + 1}/{max(1, (total + 9) // 10)} • {total} transactions")
+    return embed
+
+@tree.command(name="transactions", description="View currency transaction history", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+@app_commands.describe(user="User to view (staff only, defaults to you)")
+async def transactions(interaction: discord.Interaction, user: discord.Member = None):
+    if user and user.id != interaction.user.id and not has_staff_role(interaction):
+        await interaction.response.send_message("You don't have permission to view other users' transactions.", ephemeral=True)
+        return
+    
+    user_id = str((user or interaction.user).id)
+    settle_income(user_id, get_member_role_ids(user or interaction.user))
+    await interaction.response.send_message(embed=build_transactions_embed(user_id, 0), view=TransactionsView(user_id), ephemeral=True)
+
 # --------- Reaction Role Commands -----------
 
 @tree.command(name="reaction_role_setup", description="Set up a reaction role message", guild=discord.Object(id=GUILD_ID))
@@ -1149,6 +3256,128 @@ async def reaction_role_add(interaction: discord.Interaction, message_id: str, e
 
 # --------- Auction System -----------
 
+def build_auction_image_embeds(images: list):
+    """One embed per image URL, so all images fit in a single message"""
+    embeds = []
+    for url in images:
+        if url and url.strip().startswith(("http://", "https://")):
+            embed = discord.Embed(color=DEFAULT_EMBED_COLOR)
+            embed.set_image(url=url.strip())
+            embeds.append(embed)
+    return embeds
+
+async def create_auction_thread(forum_channel: discord.ForumChannel, name: str, auction_text: str, images: list):
+    """Create an auction forum post with its images as embeds in the starter message"""
+    embeds = build_auction_image_embeds(images)
+    try:
+        created = await forum_channel.create_thread(name=name, content=auction_text, embeds=embeds)
+    except discord.HTTPException as e:
+        if e.status != 400 or not embeds:
+            raise
+        # Discord rejected one of the image URLs, post without them and list the links in one message
+        created = await forum_channel.create_thread(name=name, content=auction_text)
+        links = [url.strip() for url in images if url and url.strip()]
+        try:
+            await created.thread.send("\n".join(links))
+        except discord.HTTPException as e:
+            print(f"Failed to send auction images for {name}: {e}")
+    return created.thread
+
+AUCTION_BID_RE = re.compile(r"^(?:bid\s*)?\$?\s*(\d{1,7})\s*\$?$", re.IGNORECASE)
+AUCTION_IA_RE = re.compile(r"^(?:ia|instant\s*accept|instant)!?$", re.IGNORECASE)
+AMOUNT_RE = re.compile(r"\d+(?:\.\d+)?")
+
+auction_summary_pending = set()  # auction IDs whose pinned summary needs an edit
+auction_bids_dirty = False
+
+def parse_auction_amount(text: str):
+    """Dollar amount from text such as '$1' or '25$', None if it has no number"""
+    match = AMOUNT_RE.search(str(text or "").replace(",", ""))
+    return float(match.group()) if match else None
+
+def get_minimum_bid(auction: dict):
+    if not auction.get("bids"):
+        return auction["starting_bid"]
+    return auction["current_bid"] + auction.get("increase", 1)
+
+def place_auction_bid(auction_id: str, user_id: int, content: str, message_id: int):
+    """Run a thread message through the auction's bid state machine.
+
+    Returns (state, detail): ("ignored", None) for chatter, ("rejected", reason),
+    ("bid", amount) for an accepted bid or ("instant_accept", amount) when the
+    auction ends on an instant accept offer.
+    """
+    auction = auction_data[auction_id]
+    content = content.strip()
+    instant_accept = parse_auction_amount(auction.get("instant_accept"))
+    
+    if AUCTION_IA_RE.match(content):
+        if instant_accept is None:
+            return "rejected", "This auction has no instant accept."
+        amount = instant_accept
+    else:
+        match = AUCTION_BID_RE.match(content)
+        if not match:
+            return "ignored", None
+        amount = int(match.group(1))
+    
+    if auction["status"] != "active":
+        return "rejected", "This auction is no longer active."
+    if user_id == auction["seller_id"]:
+        return "rejected", "You can't bid on your own auction."
+    
+    is_instant_accept = instant_accept is not None and amount >= instant_accept
+    minimum = get_minimum_bid(auction)
+    if not is_instant_accept and amount < minimum:
+        return "rejected", f"Bids must be at least ${minimum:g}."
+    
+    auction.setdefault("bids", []).append({"user_id": user_id, "amount": amount, "message_id": message_id, "timestamp": int(time.time())})
+    auction["current_bid"] = amount
+    auction["leader_id"] = user_id
+    
+    global auction_bids_dirty
+    auction_bids_dirty = True
+    auction_summary_pending.add(auction_id)
+    
+    if is_instant_accept:
+        auction["winner_id"] = user_id
+        set_auction_status(auction_id, "ended")
+        return "instant_accept", amount
+    return "bid", amount
+
+def build_auction_summary_embed(auction: dict):
+    bids = auction.get("bids", [])
+    embed = discord.Embed(title=f"{auction['name']} Bids", color=DEFAULT_EMBED_COLOR)
+    embed.add_field(name="Current Bid", value=f"${auction['current_bid']:g}" if bids else "No bids yet", inline=True)
+    embed.add_field(name="Leader", value=f"<@{auction['leader_id']}>" if bids else "None", inline=True)
+    if auction["status"] == "active":
+        embed.add_field(name="Next Bid", value=f"${get_minimum_bid(auction):g}+", inline=True)
+    else:
+        embed.add_field(name="Status", value=auction["status"].title(), inline=True)
+    if bids:
+        history = [f"<@{bid['user_id']}> ${bid['amount']:g} <t:{bid['timestamp']}:R>" for bid in reversed(bids[-5:])]
+        embed.add_field(name=f"Recent Bids ({len(bids)})", value="\n".join(history), inline=False)
+    embed.set_footer(text=f"Increase: ${auction.get('increase', 1)} • IA: {auction.get('instant_accept', 'N/A')}")
+    return embed
+
+async def handle_auction_message(message: discord.Message):
+    auction_id = str(message.channel.id)
+    state, detail = place_auction_bid(auction_id, message.author.id, message.content, message.id)
+    if state == "ignored":
+        return
+    
+    try:
+        if state == "rejected":
+            await message.reply(detail, delete_after=10)
+        elif state == "bid":
+            await message.add_reaction("✅")
+        else:
+            auction = auction_data[auction_id]
+            await message.add_reaction("✅")
+            await message.channel.send(f"🔨 {message.author.mention} instant accepted **{auction['name']}** at ${detail:g}! <@{auction['seller_id']}>")
+    except discord.HTTPException:
+        pass
+
 @tree.command(name="auction_post", description="Post an auction item", guild=discord.Object(id=GUILD_ID))
 @guild_only()
 @app_commands.describe(
@@ -1272,21 +3501,12 @@ async def auction_post(interaction: discord.Interaction, name: str, server: app_
         await interaction.response.send_message("Auction forum channel not found. Please check the AUCTION_FORUM_CHANNEL_ID in the config.")
         return
     
+    # Creating the post can take longer than the interaction window
+    await interaction.response.defer()
+    
     try:
-        # Create forum thread
-        thread = await forum_channel.create_thread(
-            name=name,
-            content=auction_text
-        )
-
-        # Send images as separate messages
-        images = [image1, image2, image3, image4, image5]
-        for img_url in images:
-            if img_url and img_url.strip():  # Check for non-empty URLs
-                try:
-                    await thread.send(img_url)
-                except Exception as e:
-                    print(f"Failed to send image {img_url}: {e}")
+        # Create forum thread with the images in its starter message
+        thread = await create_auction_thread(forum_channel, name, auction_text, [image1, image2, image3, image4, image5])
         
         # Save auction data
         auction_id = str(thread.id)
@@ -1299,15 +3519,19 @@ async def auction_post(interaction: discord.Interaction, name: str, server: app_
             "starting_bid": starting_bid,
             "current_bid": starting_bid,
             "instant_accept": instant_accept,
+            "increase": int(parse_auction_amount(increase.value)),
+            "bids": [],
             "thread_id": thread.id,
             "status": "active"
         }
+        index_auction(auction_id)
+        auction_summary_pending.add(auction_id)
         save_json("auctions.json", auction_data)
         
-        await interaction.response.send_message(f"Auction for {name} has been posted in {thread.mention}!")
+        await interaction.followup.send(f"Auction for {name} has been posted in {thread.mention}!")
         
     except Exception as e:
-        await interaction.response.send_message(f"Failed to create auction thread: {str(e)}")
+        await interaction.followup.send(f"Failed to create auction thread: {str(e)}")
 
 @tree.command(name="premium_auction_post", description="Post a premium auction item", guild=discord.Object(id=GUILD_ID))
 @guild_only()
@@ -1440,21 +3664,12 @@ async def premium_auction_post(interaction: discord.Interaction, name: str, serv
         await interaction.response.send_message("Premium auction forum channel not found. Please check the PREMIUM_AUCTION_FORUM_CHANNEL_ID in the config.")
         return
     
+    # Creating the post can take longer than the interaction window
+    await interaction.response.defer()
+    
     try:
-        # Create forum thread
-        thread = await forum_channel.create_thread(
-            name=name,
-            content=auction_text
-        )
-
-        # Send images as separate messages
-        images = [image1, image2, image3, image4, image5]
-        for img_url in images:
-            if img_url and img_url.strip():  # Check for non-empty URLs
-                try:
-                    await thread.send(img_url)
-                except Exception as e:
-                    print(f"Failed to send image {img_url}: {e}")
+        # Create forum thread with the images in its starter message
+        thread = await create_auction_thread(forum_channel, name, auction_text, [image1, image2, image3, image4, image5])
         
         # Use a slot
         premium_slots[seller_id]["used_slots"] += 1
@@ -1470,21 +3685,26 @@ async def premium_auction_post(interaction: discord.Interaction, name: str, serv
             "starting_bid": starting_bid,
             "current_bid": starting_bid,
             "instant_accept": instant_accept,
+            "increase": int(parse_auction_amount(increase.value)),
+            "bids": [],
             "thread_id": thread.id,
             "status": "active",
             "is_premium": True
         }
+        index_auction(auction_id)
+        auction_summary_pending.add(auction_id)
         save_all()
         
         available_slots = premium_slots[seller_id]["total_slots"] - premium_slots[seller_id]["used_slots"]
-        await interaction.response.send_message(f"Premium auction for {name} has been posted in {thread.mention}!\n{seller.mention} now has {available_slots} premium slots remaining.")
+        await interaction.followup.send(f"Premium auction for {name} has been posted in {thread.mention}!\n{seller.mention} now has {available_slots} premium slots remaining.")
         
     except Exception as e:
-        await interaction.response.send_message(f"Failed to create premium auction thread: {str(e)}")
+        await interaction.followup.send(f"Failed to create premium auction thread: {str(e)}")
 
 @tree.command(name="auction_end", description="End an auction early", guild=discord.Object(id=GUILD_ID))
 @guild_only()
 @app_commands.describe(auction_id="Auction thread ID")
+@app_commands.autocomplete(auction_id=active_auction_autocomplete)
 async def auction_end(interaction: discord.Interaction, auction_id: str):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
@@ -1499,20 +3719,14 @@ async def auction_end(interaction: discord.Interaction, auction_id: str):
         await interaction.response.send_message("Auction is not active.")
         return
     
-    auction["status"] = "ended"
-    
-    # Return premium slot if it was a premium auction
-    if auction.get("is_premium"):
-        seller_id = str(auction["seller_id"])
-        if seller_id in premium_slots and premium_slots[seller_id]["used_slots"] > 0:
-            premium_slots[seller_id]["used_slots"] -= 1
-    
+    set_auction_status(auction_id, "ended")
     save_all()
     await interaction.response.send_message(f"Auction {auction['name']} has been ended.")
 
 @tree.command(name="auction_cancel", description="Cancel an auction", guild=discord.Object(id=GUILD_ID))
 @guild_only()
 @app_commands.describe(auction_id="Auction thread ID")
+@app_commands.autocomplete(auction_id=auction_autocomplete)
 async def auction_cancel(interaction: discord.Interaction, auction_id: str):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
@@ -1523,13 +3737,7 @@ async def auction_cancel(interaction: discord.Interaction, auction_id: str):
         return
     
     auction = auction_data[auction_id]
-    auction["status"] = "cancelled"
-    
-    # Return premium slot if it was a premium auction
-    if auction.get("is_premium"):
-        seller_id = str(auction["seller_id"])
-        if seller_id in premium_slots and premium_slots[seller_id]["used_slots"] > 0:
-            premium_slots[seller_id]["used_slots"] -= 1
+    set_auction_status(auction_id, "cancelled")
     
     # Try to close the thread
     try:
@@ -1542,24 +3750,25 @@ async def auction_cancel(interaction: discord.Interaction, auction_id: str):
     save_all()
     await interaction.response.send_message(f"Auction {auction['name']} has been cancelled.")
 
-@tree.command(name="auction_list", description="List active auctions", guild=discord.Object(id=GUILD_ID))
-@guild_only()
-async def auction_list(interaction: discord.Interaction):
-    active_auctions = [a for a in auction_data.values() if a["status"] == "active"]
-    
-    if not active_auctions:
-        await interaction.response.send_message("No active auctions found.")
-        return
-    
-    embed = discord.Embed(title="Active Auctions", color=DEFAULT_EMBED_COLOR)
+def build_auction_list_embed(guild: discord.Guild, filters: dict, page: int):
+    auction_ids = auction_lookup.query(**filters)
+    total = len(auction_ids)
+    currency_symbol = get_currency_symbol()
+    title = "Active Auctions" if filters.get("status") == "active" else "Auctions"
+    embed = discord.Embed(title=title, color=DEFAULT_EMBED_COLOR)
     
-    for auction in active_auctions[:10]:  # Limit to 10 for space
-        seller = interaction.guild.get_member(auction["seller_id"])
+    for auction_id in auction_ids[page * 10:page * 10 + 10]:
+        auction = auction_data[auction_id]
+        seller = guild.get_member(auction["seller_id"])
         seller_name = seller.display_name if seller else "Unknown"
         
         field_value = f"Seller: {seller_name}\nStarting: ${auction['starting_bid']}"
         if auction.get("is_premium"):
             field_value += " (Premium)"
+        field_value += f"\n{auction.get('server', 'N/A')} • {auction.get('rarity', 'NA')} • {auction.get('type_category', 'NA')}"
+        if filters.get("status") != "active":
+            field_value += f"\nStatus: {auction['status'].title()}"
+        field_value += f"\n<#{auction['thread_id']}>"
         
         embed.add_field(
             name=auction["name"],
@@ -1567,10 +3776,61 @@ async def auction_list(interaction: discord.Interaction):
             inline=True
         )
     
-    if len(active_auctions) > 10:
-        embed.set_footer(text=f"Showing 10 of {len(active_auctions)} active auctions")
+    if not total:
+        embed.description = "No auctions match these filters."
+    embed.set_footer(text=f"Page {page + 1}/{max(1, (total + 9) // 10)} • {total} auctions")
+    return embed
+
+@tree.command(name="auction_list", description="List auctions", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+@app_commands.describe(
+    status="Auction status (defaults to active)",
+    server="Only show auctions on this server",
+    rarity="Only show auctions of this rarity",
+    type_category="Only show auctions of this type",
+    seller="Only show auctions by this seller",
+    page="Page to start on"
+)
+@app_commands.choices(
+    status=[
+        app_commands.Choice(name="Active", value="active"),
+        app_commands.Choice(name="Ended", value="ended"),
+        app_commands.Choice(name="Cancelled", value="cancelled"),
+    ],
+    server=[
+        app_commands.Choice(name="US", value="US"),
+        app_commands.Choice(name="UK", value="UK"),
+        app_commands.Choice(name="CA", value="CA"),
+        app_commands.Choice(name="TR", value="TR"),
+        app_commands.Choice(name="N/A", value="N/A"),
+    ],
+    rarity=[
+        app_commands.Choice(name="S", value="S"),
+        app_commands.Choice(name="NS", value="NS"),
+        app_commands.Choice(name="NA", value="NA"),
+    ],
+    type_category=[
+        app_commands.Choice(name="EXO", value="EXO"),
+        app_commands.Choice(name="OG", value="OG"),
+        app_commands.Choice(name="NA", value="NA"),
+    ]
+)
+async def auction_list(interaction: discord.Interaction, status: app_commands.Choice[str] = None, server: app_commands.Choice[str] = None, rarity: app_commands.Choice[str] = None, type_category: app_commands.Choice[str] = None, seller: discord.Member = None, page: app_commands.Range[int, 1] = 1):
+    filters = {
+        "status": status.value if status else "active",
+        "server": server.value if server else None,
+        "rarity": rarity.value if rarity else None,
+        "type_category": type_category.value if type_category else None,
+        "seller_id": seller.id if seller else None,
+    }
+    total = len(auction_lookup.query(**filters))
+    if not total:
+        await interaction.response.send_message("No auctions found.")
+        return
     
-    await interaction.response.send_message(embed=embed)
+    view = AuctionListView(filters)
+    view.page = min(page - 1, (total - 1) // 10)
+    await interaction.response.send_message(embed=build_auction_list_embed(interaction.guild, filters, view.page), view=view)
 
 # --------- Premium Slot Management Commands -----------
 
@@ -2239,14 +4499,22 @@ async def autoresponder_delete(interaction: discord.Interaction, name: str):
 
 # --------- Role Menu System -----------
 
+# Role menu message ID -> menu ID, used by the persistent RoleMenuView
+role_menu_message_index = {
+    menu["message_id"]: menu_id
+    for menu_id, menu in server_settings.get("role_menus", {}).items()
+}
+
 class RoleMenuView(discord.ui.View):
-    def __init__(self, menu_id: str):
+    """Persistent view shared by every role menu message, resolved by message ID on click"""
+
+    def __init__(self):
         super().__init__(timeout=None)
-        self.menu_id = menu_id
     
-    @discord.ui.button(label="🎭 Get Roles", style=discord.ButtonStyle.primary)
+    @discord.ui.button(label="🎭 Get Roles", style=discord.ButtonStyle.primary, custom_id="role_menu:open")
     async def role_menu(self, interaction: discord.Interaction, button: discord.ui.Button):
-        menu_data = server_settings.get("role_menus", {}).get(self.menu_id)
+        menu_id = role_menu_message_index.get(interaction.message.id)
+        menu_data = server_settings.get("role_menus", {}).get(menu_id)
         if not menu_data:
             await interaction.response.send_message("Role menu not found.", ephemeral=True)
             return
@@ -2321,8 +4589,7 @@ async def role_menu_create(interaction: discord.Interaction, title: str, descrip
     embed = discord.Embed(title=title, description=description, color=DEFAULT_EMBED_COLOR)
     embed.set_footer(text="Click the button below to select roles!")
     
-    view = RoleMenuView(menu_id)
-    message = await channel.send(embed=embed, view=view)
+    message = await channel.send(embed=embed, view=RoleMenuView())
     
     if "role_menus" not in server_settings:
         server_settings["role_menus"] = {}
@@ -2332,8 +4599,11 @@ async def role_menu_create(interaction: discord.Interaction, title: str, descrip
         "description": description,
         "channel_id": channel.id,
         "message_id": message.id,
-        "roles": {}
+        "roles": {},
+        "persistent_view": True
     }
+    role_menu_message_index[message.id] = menu_id
+    index_role_menu(menu_id)
     save_json("server_settings.json", server_settings)
     
     await interaction.response.send_message(f"✅ Role menu created! Menu ID: {menu_id}\nUse `/role_menu_add_role` to add roles to this menu.")
@@ -2345,6 +4615,7 @@ async def role_menu_create(interaction: discord.Interaction, title: str, descrip
     role="Role to add",
     description="Description of the role (optional)"
 )
+@app_commands.autocomplete(menu_id=role_menu_autocomplete)
 async def role_menu_add_role(interaction: discord.Interaction, menu_id: str, role: discord.Role, description: str = None):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
@@ -2373,13 +4644,10 @@ async def cleanup_data(interaction: discord.Interaction):
     cleaned_items = []
     
     # Clean up old auctions
-    old_auctions = []
-    for auction_id, auction in auction_data.items():
-        if auction["status"] in ["ended", "cancelled"]:
-            old_auctions.append(auction_id)
+    old_auctions = auction_lookup.query(status="ended") + auction_lookup.query(status="cancelled")
     
     for auction_id in old_auctions:
-        del auction_data[auction_id]
+        delete_auction(auction_id)
     
     if old_auctions:
         cleaned_items.append(f"Removed {len(old_auctions)} old auctions")
@@ -2575,104 +4843,236 @@ async def tierlist_move(interaction: discord.Interaction, item: str, new_tier: a
 
 # --------- Giveaway System -----------
 
+class GiveawayRules:
+    """A giveaway's join requirements compiled into frozensets for fast membership checks"""
+
+    def __init__(self, giveaway: dict):
+        self.required_roles = frozenset(giveaway.get("required_roles", [])) if giveaway.get("role_restricted") else frozenset()
+        self.bypass_roles = frozenset(giveaway.get("bypass_roles", []))
+        self.required_level = giveaway.get("required_level", 0)
+        self.required_messages = giveaway.get("required_messages", {})
+        # Ordered, the first matching role decides the entry count
+        self.extra_entries = tuple((r["role_id"], r["entries"]) for r in giveaway.get("extra_entry_roles", []))
+
+    def check(self, user_id: str, role_ids: frozenset):
+        """Return the reason a member can't join, or None if they're eligible"""
+        if self.required_roles and self.required_roles.isdisjoint(role_ids):
+            return "You don't have the required roles to join this giveaway."
+        
+        has_bypass = not self.bypass_roles.isdisjoint(role_ids)
+        if self.required_level > 0 and not has_bypass:
+            if calculate_level(member_stats.get(user_id, {}).get("xp", 0)) < self.required_level:
+                return f"You need to be Level {self.required_level} or higher to join this giveaway."
+        
+        if self.required_messages.get("amount", 0) > 0 and not has_bypass:
+            if get_required_message_count(user_id, self.required_messages) < self.required_messages["amount"]:
+                return f"You need {describe_message_requirement(self.required_messages)} to join this giveaway."
+        return None
+
+    def entries_for(self, role_ids: frozenset):
+        for role_id, entries in self.extra_entries:
+            if role_id in role_ids:
+                return entries
+        return 1
+
+giveaway_rules = {}  # giveaway_id -> GiveawayRules, rebuilt when requirements change
+
+def get_giveaway_rules(giveaway_id: str):
+    rules = giveaway_rules.get(giveaway_id)
+    if rules is None:
+        rules = giveaway_rules[giveaway_id] = GiveawayRules(giveaways_data[giveaway_id])
+    return rules
+
+member_role_cache = {}  # member_id -> frozenset of role IDs, dropped on role changes and leaves, dict order is LRU
+
+def get_member_role_ids(member: discord.Member):
+    role_ids = member_role_cache.pop(member.id, None)
+    if role_ids is None:
+        role_ids = frozenset(role.id for role in member.roles)
+        if len(member_role_cache) >= MEMBER_ROLE_CACHE_SIZE:
+            del member_role_cache[next(iter(member_role_cache))]
+    member_role_cache[member.id] = role_ids
+    return role_ids
+
+class GiveawayParticipants:
+    """Compact participant list: parallel int64 user ID and entry count arrays plus a position index"""
+
+    def __init__(self):
+        self.user_ids = array("q")
+        self.entries = array("I")
+        self.positions = {}  # user_id -> index into the arrays
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __contains__(self, user_id: int):
+        return user_id in self.positions
+
+    def get_entries(self, user_id: int):
+        position = self.positions.get(user_id)
+        return self.entries[position] if position is not None else 0
+
+    def set(self, user_id: int, entries: int):
+        """Add or update a participant, returns True if anything changed"""
+        position = self.positions.get(user_id)
+        if position is None:
+            self.positions[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self.entries.append(entries)
+            return True
+        if self.entries[position] != entries:
+            self.entries[position] = entries
+            return True
+        return False
+
+    def items(self):
+        return zip(self.user_ids, self.entries)
+
+    def total_entries(self):
+        return sum(self.entries)
+
+class GiveawayParticipantLog:
+    """Per-giveaway append-only join logs with batched flushes.
+
+    Joins only touch the in-memory arrays and a pending buffer; the buffer is appended
+    to giveaway_participants/<giveaway_id>.jsonl every few seconds, so the giveaway
+    record itself is only rewritten on state changes.
+    """
+
+    def __init__(self, directory: str = "giveaway_participants"):
+        self.directory = directory
+        self.participants = {}  # giveaway_id -> GiveawayParticipants, loaded on first use
+        self.pending = {}  # giveaway_id -> [[user_id, entries], ...] not yet on disk
+
+    def path(self, giveaway_id: str):
+        return os.path.join(self.directory, f"{giveaway_id}.jsonl")
+
+    def get(self, giveaway_id: str):
+        participants = self.participants.get(giveaway_id)
+        if participants is None:
+            participants = GiveawayParticipants()
+            for user_id, entries in load_jsonl(self.path(giveaway_id)):
+                participants.set(user_id, entries)
+            self.participants[giveaway_id] = participants
+        return participants
+
+    def join(self, giveaway_id: str, user_id: int, entries: int):
+        if self.get(giveaway_id).set(user_id, entries):
+            self.pending.setdefault(giveaway_id, []).append([user_id, entries])
+
+    def flush(self, giveaway_id: str = None):
+        giveaway_ids = [giveaway_id] if giveaway_id else list(self.pending)
+        for pending_id in giveaway_ids:
+            records = self.pending.pop(pending_id, None)
+            if records:
+                os.makedirs(self.directory, exist_ok=True)
+                append_jsonl(self.path(pending_id), records)
+
+    def draws_path(self, giveaway_id: str):
+        return os.path.join(self.directory, f"{giveaway_id}.draws.jsonl")
+
+    def record_draw(self, giveaway_id: str, seed: int, picks: int, weights: list, excluded: list):
+        """Append the exact inputs of a draw to the giveaway's draw log and return their SHA-256"""
+        record = {"seed": seed, "picks": picks, "excluded": sorted(excluded), "weights": weights}
+        digest = hashlib.sha256(json.dumps(record, separators=(",", ":")).encode()).hexdigest()
+        os.makedirs(self.directory, exist_ok=True)
+        append_jsonl(self.draws_path(giveaway_id), [dict(record, sha256=digest)])
+        return digest
+
+    def draw_inputs(self, giveaway_id: str, digest: str):
+        """Return the logged inputs whose content still hashes to digest, or None"""
+        for record in load_jsonl(self.draws_path(giveaway_id)):
+            if record.pop("sha256", None) == digest and hashlib.sha256(json.dumps(record, separators=(",", ":")).encode()).hexdigest() == digest:
+                return record
+        return None
+
+    def delete(self, giveaway_id: str):
+        self.participants.pop(giveaway_id, None)
+        self.pending.pop(giveaway_id, None)
+        for path in (self.path(giveaway_id), self.draws_path(giveaway_id)):
+            if os.path.isfile(path):
+                os.remove(path)
+
+giveaway_participants = GiveawayParticipantLog()
+
+# Move participants stored inside giveaway records into the participant logs
+if any("participants" in giveaway for giveaway in giveaways_data.values()):
+    for giveaway_id, giveaway in giveaways_data.items():
+        for user_id, data in giveaway.pop("participants", {}).items():
+            giveaway_participants.join(giveaway_id, int(user_id), data["entries"])
+    giveaway_participants.flush()
+    save_json("giveaways.json", giveaways_data)
+
+# Giveaway message ID -> giveaway ID, used by the persistent GiveawayView
+giveaway_message_index = {
+    giveaway["message_id"]: giveaway_id
+    for giveaway_id, giveaway in giveaways_data.items()
+    if giveaway.get("message_id")
+}
+
 class GiveawayView(discord.ui.View):
-    def __init__(self, giveaway_id: str):
+    """Persistent view shared by every giveaway message.
+
+    Buttons use fixed custom_ids and the giveaway is looked up from the clicked
+    message, so a single registered instance serves all giveaways after a restart.
+    """
+
+    def __init__(self):
         super().__init__(timeout=None)
-        self.giveaway_id = giveaway_id
 
-    @discord.ui.button(label="🎉 Join Giveaway", style=discord.ButtonStyle.primary)
+    def get_giveaway(self, interaction: discord.Interaction):
+        giveaway_id = giveaway_message_index.get(interaction.message.id)
+        return giveaway_id, giveaways_data.get(giveaway_id)
+
+    @discord.ui.button(label="🎉 Join Giveaway", style=discord.ButtonStyle.primary, custom_id="giveaway:join")
     async def join_giveaway(self, interaction: discord.Interaction, button: discord.ui.Button):
-        giveaway = giveaways_data.get(self.giveaway_id)
+        giveaway_id, giveaway = self.get_giveaway(interaction)
         if not giveaway or giveaway["status"] != "active":
             await interaction.response.send_message("This giveaway is no longer active.", ephemeral=True)
             return
         
-        user_id = str(interaction.user.id)
-        
-        # Check role restrictions
-        if giveaway.get("role_restricted") and giveaway.get("required_roles"):
-            user_role_ids = [role.id for role in interaction.user.roles]
-            if not any(role_id in user_role_ids for role_id in giveaway["required_roles"]):
-                await interaction.response.send_message("You don't have the required roles to join this giveaway.", ephemeral=True)
-                return
+        # Check role, level and message requirements
+        rules = get_giveaway_rules(giveaway_id)
+        role_ids = get_member_role_ids(interaction.user)
+        reason = rules.check(str(interaction.user.id), role_ids)
+        if reason:
+            await interaction.response.send_message(reason, ephemeral=True)
+            return
         
-        # Check level requirement
-        if giveaway.get("required_level", 0) > 0:
-            user_level = calculate_level(member_stats.get(user_id, {}).get("xp", 0))
-            if user_level < giveaway["required_level"]:
-                # Check bypass roles
-                if giveaway.get("bypass_roles"):
-                    user_role_ids = [role.id for role in interaction.user.roles]
-                    has_bypass = any(role_id in user_role_ids for role_id in giveaway["bypass_roles"])
-                    if not has_bypass:
-                        await interaction.response.send_message(f"You need to be Level {giveaway['required_level']} or higher to join this giveaway.", ephemeral=True)
-                        return
-                else:
-                    await interaction.response.send_message(f"You need to be Level {giveaway['required_level']} or higher to join this giveaway.", ephemeral=True)
-                    return
-        
-        # Check message requirements
-        if giveaway.get("required_messages", {}).get("amount", 0) > 0:
-            message_type = giveaway["required_messages"]["type"]
-            required_count = giveaway["required_messages"]["amount"]
-            user_messages = member_stats.get(user_id, {}).get(f"{message_type}_messages", 0)
-            
-            if user_messages < required_count:
-                # Check bypass roles
-                if giveaway.get("bypass_roles"):
-                    user_role_ids = [role.id for role in interaction.user.roles]
-                    has_bypass = any(role_id in user_role_ids for role_id in giveaway["bypass_roles"])
-                    if not has_bypass:
-                        await interaction.response.send_message(f"You need {required_count} {message_type.replace('_', ' ')} messages to join this giveaway.", ephemeral=True)
-                        return
-                else:
-                    await interaction.response.send_message(f"You need {required_count} {message_type.replace('_', ' ')} messages to join this giveaway.", ephemeral=True)
-                    return
-        
-        # Add user to participants
-        if user_id not in giveaway["participants"]:
-            giveaway["participants"][user_id] = {"entries": 1}
-        
-        # Check for extra entries
-        if giveaway.get("extra_entry_roles"):
-            user_role_ids = [role.id for role in interaction.user.roles]
-            for role_config in giveaway["extra_entry_roles"]:
-                if role_config["role_id"] in user_role_ids:
-                    giveaway["participants"][user_id]["entries"] = role_config["entries"]
-                    break
+        # Entries are recomputed from current roles when the giveaway is drawn
+        entries = rules.entries_for(role_ids)
         
-        save_json("giveaways.json", giveaways_data)
+        # Add user to participants, the join is persisted with the next log flush
+        giveaway_participants.join(giveaway_id, interaction.user.id, entries)
         
-        entries = giveaway["participants"][user_id]["entries"]
         entry_text = "entry" if entries == 1 else "entries"
         await interaction.response.send_message(f"You've joined the giveaway with {entries} {entry_text}!", ephemeral=True)
 
-    @discord.ui.button(label="📊 View Participants", style=discord.ButtonStyle.secondary)
+    @discord.ui.button(label="📊 View Participants", style=discord.ButtonStyle.secondary, custom_id="giveaway:participants")
     async def view_participants(self, interaction: discord.Interaction, button: discord.ui.Button):
-        giveaway = giveaways_data.get(self.giveaway_id)
+        giveaway_id, giveaway = self.get_giveaway(interaction)
         if not giveaway:
             await interaction.response.send_message("Giveaway not found.", ephemeral=True)
             return
         
-        if not giveaway["participants"]:
+        participants = giveaway_participants.get(giveaway_id)
+        if not participants:
             await interaction.response.send_message("No participants yet.", ephemeral=True)
             return
         
         embed = discord.Embed(title="Giveaway Participants", color=DEFAULT_EMBED_COLOR)
         
         participant_list = []
-        for user_id, data in giveaway["participants"].items():
-            entries = data["entries"]
+        for user_id, entries in itertools.islice(participants.items(), 20):  # Limit to 20 for space
             entry_text = "entry" if entries == 1 else "entries"
             participant_list.append(f"<@{user_id}> - {entries} {entry_text}")
         
-        embed.description = "\n".join(participant_list[:20])  # Limit to 20 for space
-        if len(participant_list) > 20:
-            embed.description += f"\n... and {len(participant_list) - 20} more"
+        embed.description = "\n".join(participant_list)
+        if len(participants) > 20:
+            embed.description += f"\n... and {len(participants) - 20} more"
         
-        embed.add_field(name="Total Participants", value=str(len(giveaway["participants"])), inline=True)
-        total_entries = sum(data["entries"] for data in giveaway["participants"].values())
-        embed.add_field(name="Total Entries", value=str(total_entries), inline=True)
+        embed.add_field(name="Total Participants", value=str(len(participants)), inline=True)
+        embed.add_field(name="Total Entries", value=str(participants.total_entries()), inline=True)
         
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
@@ -2690,6 +5090,7 @@ class GiveawayView(discord.ui.View):
     required_level="Required level (optional)",
     required_messages_type="Required message type (optional)",
     required_messages_amount="Required message amount (optional)",
+    required_messages_days=f"Count required messages over the last N days instead (1-{ACTIVITY_HISTORY_DAYS}, optional)",
     thumbnail_url="Thumbnail URL (optional)",
     image_url="Image URL (optional)",
     claim_time_hours="Hours for winners to claim (optional)"
@@ -2706,7 +5107,7 @@ class GiveawayView(discord.ui.View):
         app_commands.Choice(name="All Time", value="all_time"),
     ]
 )
-async def giveaway_create(interaction: discord.Interaction, name: str, prizes: str, duration_hours: int, winners: int, channel: discord.TextChannel, host: discord.Member, embed_color: str = None, role_restricted: app_commands.Choice[str] = None, required_level: int = None, required_messages_type: app_commands.Choice[str] = None, required_messages_amount: int = None, thumbnail_url: str = None, image_url: str = None, claim_time_hours: int = None):
+async def giveaway_create(interaction: discord.Interaction, name: str, prizes: str, duration_hours: int, winners: int, channel: discord.TextChannel, host: discord.Member, embed_color: str = None, role_restricted: app_commands.Choice[str] = None, required_level: int = None, required_messages_type: app_commands.Choice[str] = None, required_messages_amount: int = None, required_messages_days: app_commands.Range[int, 1, ACTIVITY_HISTORY_DAYS] = None, thumbnail_url: str = None, image_url: str = None, claim_time_hours: int = None):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
         return
@@ -2735,7 +5136,6 @@ async def giveaway_create(interaction: discord.Interaction, name: str, prizes: s
         "channel_id": channel.id,
         "winners": winners,
         "end_time": end_time,
-        "participants": {},
         "status": "created",
         "embed_color": color,
         "role_restricted": role_restricted.value == "yes" if role_restricted else False,
@@ -2745,7 +5145,8 @@ async def giveaway_create(interaction: discord.Interaction, name: str, prizes: s
         "required_level": required_level or 0,
         "required_messages": {
             "type": required_messages_type.value if required_messages_type else None,
-            "amount": required_messages_amount or 0
+            "amount": required_messages_amount or 0,
+            "days": required_messages_days
         },
         "thumbnail_url": thumbnail_url,
         "image_url": image_url,
@@ -2755,6 +5156,7 @@ async def giveaway_create(interaction: discord.Interaction, name: str, prizes: s
     }
     
     giveaways_data[giveaway_id] = giveaway_data
+    index_giveaway(giveaway_id)
     save_json("giveaways.json", giveaways_data)
     
     # Create test embed
@@ -2766,7 +5168,7 @@ async def giveaway_create(interaction: discord.Interaction, name: str, prizes: s
     if required_level:
         embed.add_field(name="Required Level", value=str(required_level), inline=True)
     if required_messages_amount:
-        embed.add_field(name="Required Messages", value=f"{required_messages_amount} {required_messages_type.value.replace('_', ' ')}", inline=True)
+        embed.add_field(name="Required Messages", value=describe_message_requirement(giveaway_data["required_messages"]), inline=True)
     
     if thumbnail_url:
         embed.set_thumbnail(url=thumbnail_url)
@@ -2810,7 +5212,7 @@ class GiveawayTestView(discord.ui.View):
         if giveaway["required_level"]:
             embed.add_field(name="Required Level", value=str(giveaway["required_level"]), inline=True)
         if giveaway["required_messages"]["amount"]:
-            embed.add_field(name="Required Messages", value=f"{giveaway['required_messages']['amount']} {giveaway['required_messages']['type'].replace('_', ' ')}", inline=True)
+            embed.add_field(name="Required Messages", value=describe_message_requirement(giveaway["required_messages"]), inline=True)
         
         if giveaway.get("thumbnail_url"):
             embed.set_thumbnail(url=giveaway["thumbnail_url"])
@@ -2819,19 +5221,22 @@ class GiveawayTestView(discord.ui.View):
         
         embed.set_footer(text="Click the button below to join!")
         
-        view = GiveawayView(self.giveaway_id)
-        giveaway_message = await channel.send(embed=embed, view=view)
+        giveaway_message = await channel.send(embed=embed, view=GiveawayView())
         
         giveaway["message_id"] = giveaway_message.id
         giveaway["status"] = "active"
+        giveaway["persistent_view"] = True
+        giveaway_message_index[giveaway_message.id] = self.giveaway_id
         save_json("giveaways.json", giveaways_data)
+        scheduler.schedule(f"giveaway:{self.giveaway_id}", giveaway["end_time"], "giveaway_end", self.giveaway_id)
         
         await interaction.response.edit_message(content=f"✅ Giveaway started in {channel.mention}!", embed=None, view=None)
 
 @tree.command(name="giveaway_end", description="End a giveaway early", guild=discord.Object(id=GUILD_ID))
 @guild_only()
-@app_commands.describe(giveaway_id="Giveaway ID")
-async def giveaway_end(interaction: discord.Interaction, giveaway_id: str):
+@app_commands.describe(giveaway_id="Giveaway ID", seed="Seed for a reproducible draw (optional)")
+@app_commands.autocomplete(giveaway_id=open_giveaway_autocomplete)
+async def giveaway_end(interaction: discord.Interaction, giveaway_id: str, seed: int = None):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
         return
@@ -2840,8 +5245,12 @@ async def giveaway_end(interaction: discord.Interaction, giveaway_id: str):
     if not giveaway:
         await interaction.response.send_message("Giveaway not found.")
         return
+    if giveaway["status"] == "ended":
+        await interaction.response.send_message("This giveaway has already ended.")
+        return
     
-    await end_giveaway(giveaway_id, interaction.guild)
+    scheduler.cancel(f"giveaway:{giveaway_id}")
+    await end_giveaway(giveaway_id, interaction.guild, seed=seed)
     await interaction.response.send_message("Giveaway ended!")
 
 
@@ -2849,6 +5258,7 @@ async def giveaway_end(interaction: discord.Interaction, giveaway_id: str):
 @tree.command(name="giveaway_add_role", description="Add a required role to a giveaway", guild=discord.Object(id=GUILD_ID))
 @guild_only()
 @app_commands.describe(giveaway_id="Giveaway ID", role="Role to require")
+@app_commands.autocomplete(giveaway_id=open_giveaway_autocomplete)
 async def giveaway_add_role(interaction: discord.Interaction, giveaway_id: str, role: discord.Role):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
@@ -2862,6 +5272,7 @@ async def giveaway_add_role(interaction: discord.Interaction, giveaway_id: str,
     if role.id not in giveaway["required_roles"]:
         giveaway["required_roles"].append(role.id)
         giveaway["role_restricted"] = True
+        giveaway_rules.pop(giveaway_id, None)
         save_json("giveaways.json", giveaways_data)
         await interaction.response.send_message(f"Added {role.name} as a required role for the giveaway.")
     else:
@@ -2870,6 +5281,7 @@ async def giveaway_add_role(interaction: discord.Interaction, giveaway_id: str,
 @tree.command(name="giveaway_add_extra_entry", description="Add extra entry role to a giveaway", guild=discord.Object(id=GUILD_ID))
 @guild_only()
 @app_commands.describe(giveaway_id="Giveaway ID", role="Role for extra entries", entries="Number of entries")
+@app_commands.autocomplete(giveaway_id=open_giveaway_autocomplete)
 async def giveaway_add_extra_entry(interaction: discord.Interaction, giveaway_id: str, role: discord.Role, entries: int):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
@@ -2888,12 +5300,14 @@ async def giveaway_add_extra_entry(interaction: discord.Interaction, giveaway_id
     giveaway["extra_entry_roles"] = [r for r in giveaway["extra_entry_roles"] if r["role_id"] != role.id]
     
     giveaway["extra_entry_roles"].append({"role_id": role.id, "entries": entries})
+    giveaway_rules.pop(giveaway_id, None)
     save_json("giveaways.json", giveaways_data)
     await interaction.response.send_message(f"Added {role.name} for {entries} entries in the giveaway.")
 
 @tree.command(name="giveaway_add_bypass", description="Add bypass role to a giveaway", guild=discord.Object(id=GUILD_ID))
 @guild_only()
 @app_commands.describe(giveaway_id="Giveaway ID", role="Role that bypasses requirements")
+@app_commands.autocomplete(giveaway_id=open_giveaway_autocomplete)
 async def giveaway_add_bypass(interaction: discord.Interaction, giveaway_id: str, role: discord.Role):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
@@ -2906,6 +5320,7 @@ async def giveaway_add_bypass(interaction: discord.Interaction, giveaway_id: str
     
     if role.id not in giveaway["bypass_roles"]:
         giveaway["bypass_roles"].append(role.id)
+        giveaway_rules.pop(giveaway_id, None)
         save_json("giveaways.json", giveaways_data)
         await interaction.response.send_message(f"Added {role.name} as a bypass role for the giveaway.")
     else:
@@ -2918,13 +5333,15 @@ async def giveaway_add_bypass(interaction: discord.Interaction, giveaway_id: str
     reroll_all="Reroll all winners",
     member1="First member to reroll (optional)",
     member2="Second member to reroll (optional)",
-    member3="Third member to reroll (optional)"
+    member3="Third member to reroll (optional)",
+    seed="Seed for a reproducible draw (optional)"
 )
 @app_commands.choices(reroll_all=[
     app_commands.Choice(name="Yes", value="yes"),
     app_commands.Choice(name="No", value="no"),
 ])
-async def giveaway_reroll_specific_func(interaction: discord.Interaction, giveaway_id: str, reroll_all: app_commands.Choice[str], member1: discord.Member = None, member2: discord.Member = None, member3: discord.Member = None):
+@app_commands.autocomplete(giveaway_id=giveaway_autocomplete)
+async def giveaway_reroll_specific_func(interaction: discord.Interaction, giveaway_id: str, reroll_all: app_commands.Choice[str], member1: discord.Member = None, member2: discord.Member = None, member3: discord.Member = None, seed: int = None):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
         return
@@ -2935,7 +5352,7 @@ async def giveaway_reroll_specific_func(interaction: discord.Interaction, giveaw
         return
     
     if reroll_all.value == "yes":
-        await end_giveaway(giveaway_id, interaction.guild, reroll=True)
+        await end_giveaway(giveaway_id, interaction.guild, reroll=True, seed=seed)
         await interaction.response.send_message("✅ Rerolled all winners!")
     else:
         members_to_reroll = [m for m in [member1, member2, member3] if m is not None]
@@ -2943,13 +5360,14 @@ async def giveaway_reroll_specific_func(interaction: discord.Interaction, giveaw
             await interaction.response.send_message("Please specify at least one member to reroll.")
             return
         
-        await end_giveaway(giveaway_id, interaction.guild, reroll=True, specific_members=[str(m.id) for m in members_to_reroll])
+        await end_giveaway(giveaway_id, interaction.guild, reroll=True, specific_members=[str(m.id) for m in members_to_reroll], seed=seed)
         member_mentions = [m.mention for m in members_to_reroll]
         await interaction.response.send_message(f"✅ Rerolled {', '.join(member_mentions)}!")
 
 @tree.command(name="giveaway_claim", description="Mark a member as having claimed their prize", guild=discord.Object(id=GUILD_ID))
 @guild_only()
 @app_commands.describe(giveaway_id="Giveaway ID", member="Member who claimed")
+@app_commands.autocomplete(giveaway_id=giveaway_autocomplete)
 async def giveaway_claim(interaction: discord.Interaction, giveaway_id: str, member: discord.Member):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
@@ -2977,6 +5395,7 @@ async def giveaway_claim(interaction: discord.Interaction, giveaway_id: str, mem
 @tree.command(name="giveaway_unclaimed", description="View unclaimed prizes for a giveaway", guild=discord.Object(id=GUILD_ID))
 @guild_only()
 @app_commands.describe(giveaway_id="Giveaway ID")
+@app_commands.autocomplete(giveaway_id=giveaway_autocomplete)
 async def giveaway_unclaimed(interaction: discord.Interaction, giveaway_id: str):
     if not has_staff_role(interaction):
         await interaction.response.send_message("You don't have permission to use this command.", ephemeral=True)
@@ -3009,20 +5428,32 @@ async def giveaway_unclaimed(interaction: discord.Interaction, giveaway_id: str)
     
     await interaction.response.send_message(embed=embed)
 
-async def end_giveaway(giveaway_id: str, guild: discord.Guild, reroll: bool = False, specific_members: list = None):
-    import random
-    import time
-    
+def replay_giveaway_draw(giveaway_id: str, draw: dict):
+    """Re-run a recorded draw from its logged inputs, returns the picked user IDs or None if the inputs are gone"""
+    inputs = giveaway_participants.draw_inputs(giveaway_id, draw["inputs_sha256"])
+    if inputs is None:
+        return None
+    excluded = set(inputs["excluded"])
+    candidates = ((user_id, entries) for user_id, entries in inputs["weights"] if user_id not in excluded)
+    return weighted_sample(candidates, inputs["picks"], random.Random(inputs["seed"]))
+
+async def end_giveaway(giveaway_id: str, guild: discord.Guild, reroll: bool = False, specific_members: list = None, seed: int = None):
     giveaway = giveaways_data.get(giveaway_id)
-    if not giveaway:
+    if not giveaway or (giveaway["status"] == "ended" and not reroll):
         return
     
     channel = guild.get_channel(giveaway["channel_id"])
     if not channel:
         return
     
+    # Marked ended before the first await so an overlapping scheduled or manual end can't draw again
+    giveaway["status"] = "ended"
+    
     # Select winners
-    if not giveaway["participants"]:
+    participants = giveaway_participants.get(giveaway_id)
+    giveaway_participants.flush(giveaway_id)
+    if not participants:
+        save_json("giveaways.json", giveaways_data)
         embed = discord.Embed(
             title="🎉 Giveaway Ended",
             description=f"**{giveaway['name']}**\n\nNo participants!",
@@ -3031,53 +5462,46 @@ async def end_giveaway(giveaway_id: str, guild: discord.Guild, reroll: bool = Fa
         await channel.send(embed=embed)
         return
     
+    # Seeded so every draw can be reproduced from the audit log
+    if seed is None:
+        seed = new_draw_seed()
+    rng = random.Random(seed)
+    
+    # Recompute every participant's entries from their current roles in one pass,
+    # members no longer in the server keep the entries they joined with
+    rules = get_giveaway_rules(giveaway_id)
+    weights = []
+    for user_id, entries in participants.items():
+        member = guild.get_member(user_id)
+        if member:
+            entries = rules.entries_for(get_member_role_ids(member))
+        weights.append((str(user_id), entries))
+    
     # Handle specific member rerolls
     if reroll and specific_members:
-        current_winners = giveaway.get("winners_list", [])
-        # Remove specific members from winners list
-        for member_id in specific_members:
-            if member_id in current_winners:
-                current_winners.remove(member_id)
-        
-        # Select new winners to replace them
-        available_participants = [user_id for user_id in giveaway["participants"].keys() if user_id not in current_winners]
-        if available_participants:
-            weighted_available = []
-            for user_id in available_participants:
-                entries = giveaway["participants"][user_id]["entries"]
-                weighted_available.extend([user_id] * entries)
-            
-            new_winner_count = min(len(specific_members), len(available_participants))
-            if weighted_available:
-                new_winners = random.sample(weighted_available, new_winner_count)
-                # Remove duplicates
-                unique_new_winners = []
-                seen = set()
-                for winner in new_winners:
-                    if winner not in seen:
-                        unique_new_winners.append(winner)
-                        seen.add(winner)
-                
-                current_winners.extend(unique_new_winners)
-                giveaway["winners_list"] = current_winners
-    else:
-        # Create weighted list for random selection
-        weighted_participants = []
-        for user_id, data in giveaway["participants"].items():
-            weighted_participants.extend([user_id] * data["entries"])
-        
-        winner_count = min(giveaway["winners"], len(giveaway["participants"]))
-        winners = random.sample(weighted_participants, winner_count)
+        current_winners = [winner for winner in giveaway.get("winners_list", []) if winner not in specific_members]
         
-        # Remove duplicates while preserving order
-        unique_winners = []
-        seen = set()
-        for winner in winners:
-            if winner not in seen:
-                unique_winners.append(winner)
-                seen.add(winner)
-        
-        giveaway["winners_list"] = unique_winners
+        # Select new winners to replace them, never picking a current or rerolled winner again
+        excluded = set(current_winners) | set(specific_members)
+        picks = len(specific_members)
+        candidates = ((user_id, entries) for user_id, entries in weights if user_id not in excluded)
+        current_winners.extend(weighted_sample(candidates, picks, rng))
+        giveaway["winners_list"] = current_winners
+    else:
+        excluded = set()
+        picks = giveaway["winners"]
+        giveaway["winners_list"] = weighted_sample(weights, picks, rng)
+    
+    # Weights come from roles at draw time, so they are logged with the seed to make the draw replayable
+    inputs_sha256 = giveaway_participants.record_draw(giveaway_id, seed, picks, weights, excluded)
+    giveaway.setdefault("draws", []).append({
+        "seed": seed,
+        "inputs_sha256": inputs_sha256,
+        "drawn_at": int(time.time()),
+        "reroll": reroll,
+        "rerolled": specific_members or [],
+        "winners": list(giveaway["winners_list"]),
+    })
     
     # Set up claim deadline if specified
     claim_deadline = None
@@ -3094,7 +5518,7 @@ async def end_giveaway(giveaway_id: str, guild: discord.Guild, reroll: bool = Fa
     )
     
     winner_mentions = [f"<@{winner_id}>" for winner_id in giveaway["winners_list"]]
-    embed.add_field(name="Winners", value="\n".join(winner_mentions), inline=False)
+    embed.add_field(name="Winners", value="\n".join(winner_mentions) or "No eligible participants", inline=False)
     
     if host:
         embed.add_field(name="Host", value=host.mention, inline=True)
@@ -3110,16 +5534,14 @@ async def end_giveaway(giveaway_id: str, guild: discord.Guild, reroll: bool = Fa
         embed.set_image(url=giveaway["image_url"])
     
     action = "Rerolled" if reroll else "Ended"
-    embed.set_footer(text=f"Giveaway {action}")
+    embed.set_footer(text=f"Giveaway {action} • Draw seed: {seed}")
     
     winner_pings = " ".join(winner_mentions)
     if host:
         winner_pings += f" {host.mention}"
     
-    await channel.send(content=winner_pings, embed=embed)
-    
-    giveaway["status"] = "ended"
     save_json("giveaways.json", giveaways_data)
+    await channel.send(content=winner_pings, embed=embed)
 
 # --------- Member Features -----------
 
@@ -3240,15 +5662,23 @@ async def afk(interaction: discord.Interaction, reason: str = "AFK"):
 @app_commands.describe(
     time_amount="Amount of time",
     time_unit="Unit of time",
-    reminder="What to remind you about"
+    reminder="What to remind you about",
+    repeat="Repeat the reminder (optional)"
 )
-@app_commands.choices(time_unit=[
-    app_commands.Choice(name="Minutes", value="minutes"),
-    app_commands.Choice(name="Hours", value="hours"),
-    app_commands.Choice(name="Days", value="days"),
-])
-async def remindme(interaction: discord.Interaction, time_amount: int, time_unit: app_commands.Choice[str], reminder: str):
-    import time
+@app_commands.choices(
+    time_unit=[
+        app_commands.Choice(name="Minutes", value="minutes"),
+        app_commands.Choice(name="Hours", value="hours"),
+        app_commands.Choice(name="Days", value="days"),
+    ],
+    repeat=[
+        app_commands.Choice(name="Hourly", value=3600),
+        app_commands.Choice(name="Daily", value=86400),
+        app_commands.Choice(name="Weekly", value=604800),
+    ]
+)
+async def remindme(interaction: discord.Interaction, time_amount: int, time_unit: app_commands.Choice[str], reminder: str, repeat: app_commands.Choice[int] = None):
+    import uuid
     
     if time_amount <= 0:
         await interaction.response.send_message("Time amount must be positive.")
@@ -3257,21 +5687,52 @@ async def remindme(interaction: discord.Interaction, time_amount: int, time_unit
     multiplier = {"minutes": 60, "hours": 3600, "days": 86400}
     remind_time = int(time.time()) + (time_amount * multiplier[time_unit.value])
     
-    if "reminders" not in server_settings:
-        server_settings["reminders"] = {}
-    
-    user_id = str(interaction.user.id)
-    if user_id not in server_settings["reminders"]:
-        server_settings["reminders"][user_id] = []
-    
-    server_settings["reminders"][user_id].append({
+    reminder_id = uuid.uuid4().hex
+    reminder_store.add({
+        "id": reminder_id,
+        "user_id": str(interaction.user.id),
+        "channel_id": interaction.channel.id,
         "reminder": reminder,
         "remind_time": remind_time,
-        "channel_id": interaction.channel.id
+        "interval": repeat.value if repeat else None,
     })
-    save_json("server_settings.json", server_settings)
+    scheduler.schedule(f"reminder:{reminder_id}", remind_time, "reminder", reminder_id)
+    
+    repeat_text = f", then {repeat.name.lower()}" if repeat else ""
+    await interaction.response.send_message(f"✅ I'll remind you about '{reminder}' in {time_amount} {time_unit.value}{repeat_text}! (ID: {reminder_id})")
+
+@tree.command(name="reminders", description="List your pending reminders", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+async def reminders_list(interaction: discord.Interaction):
+    reminders = reminder_store.for_user(str(interaction.user.id))
+    if not reminders:
+        await interaction.response.send_message("You have no pending reminders.", ephemeral=True)
+        return
+    
+    embed = discord.Embed(title="⏰ Your Reminders", color=0xFFD700)
+    for reminder in reminders[:25]:
+        value = f"<t:{reminder['remind_time']}:R>"
+        if reminder.get("interval"):
+            value += f" (repeats every {reminder['interval'] // 3600}h)"
+        embed.add_field(name=f"{reminder['id']} - {reminder['reminder'][:80]}", value=value, inline=False)
+    
+    if len(reminders) > 25:
+        embed.set_footer(text=f"Showing 25 of {len(reminders)} reminders")
     
-    await interaction.response.send_message(f"✅ I'll remind you about '{reminder}' in {time_amount} {time_unit.value}!")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@tree.command(name="reminder_cancel", description="Cancel one of your reminders", guild=discord.Object(id=GUILD_ID))
+@guild_only()
+@app_commands.describe(reminder_id="ID of the reminder to cancel")
+async def reminder_cancel(interaction: discord.Interaction, reminder_id: str):
+    reminder = reminder_store.get(reminder_id)
+    if not reminder or reminder["user_id"] != str(interaction.user.id):
+        await interaction.response.send_message("Reminder not found.", ephemeral=True)
+        return
+    
+    reminder_store.remove(reminder_id)
+    scheduler.cancel(f"reminder:{reminder_id}")
+    await interaction.response.send_message(f"✅ Cancelled reminder '{reminder['reminder']}'", ephemeral=True)
 
 # --------- Event Handlers -----------
 
@@ -3280,6 +5741,10 @@ async def on_message(message):
     if message.author.bot or message.guild is None or message.guild.id != GUILD_ID:
         return
 
+    # Handle bids in auction threads, which are keyed by thread ID
+    if str(message.channel.id) in auction_data:
+        await handle_auction_message(message)
+
     # Handle autoresponders
     for name, autoresponder in autoresponders.items():
         trigger = autoresponder["trigger"]
@@ -3425,6 +5890,11 @@ async def on_message(message):
     member_stats[uid]["monthly_messages"] += 1
     member_stats[uid]["all_time_messages"] += 1
     member_stats[uid]["xp"] += 5
+    activity_history.record(uid)
+    channel_activity.record(channel_id)
+    active_users.record(channel_id, uid)
+    if message.content:
+        trending_terms.record(message.content)
     
     new_level = calculate_level(member_stats[uid]["xp"])
     
@@ -3469,8 +5939,8 @@ async def on_reaction_add(reaction, user):
         save_all()
     
     elif action == "currency" and "currency_amount" in config:
-        user_balances[uid] += config["currency_amount"]
-        save_all()
+        async with lock_users(uid):
+            ledger.post(uid, config["currency_amount"], "reaction_role", str(reaction.message.id))
     
     elif action == "response" and "response_message" in config:
         try:
@@ -3520,53 +5990,144 @@ async def reset_monthly():
         member_stats[uid]["monthly_messages"] = 0
     save_json("member_stats.json", member_stats)
 
-@tasks.loop(minutes=1)
-async def check_giveaways():
-    import time
-    current_time = int(time.time())
+# --------- Scheduled Jobs -----------
+
+def load_giveaway_jobs():
+    return [
+        (f"giveaway:{giveaway_id}", giveaway["end_time"], giveaway_id)
+        for giveaway_id, giveaway in giveaways_data.items()
+        if giveaway["status"] == "active"
+    ]
+
+async def run_giveaway_end(giveaway_id: str):
+    giveaway = giveaways_data.get(giveaway_id)
+    if not giveaway or giveaway["status"] != "active":
+        return
     
-    for giveaway_id, giveaway in giveaways_data.items():
-        if giveaway["status"] == "active" and current_time >= giveaway["end_time"]:
-            guild = bot.get_guild(GUILD_ID)
-            if guild:
-                await end_giveaway(giveaway_id, guild)
-
-@tasks.loop(minutes=1)
-async def check_reminders():
-    """Check for due reminders"""
-    import time
-    current_time = int(time.time())
+    guild = bot.get_guild(GUILD_ID)
+    if guild:
+        await end_giveaway(giveaway_id, guild)
+
+def load_reminder_jobs():
+    return [
+        (f"reminder:{reminder_id}", reminder["remind_time"], reminder_id)
+        for reminder_id, reminder in reminder_store.reminders.items()
+    ]
+
+async def run_reminder(reminder_id: str):
+    reminder = reminder_store.get(reminder_id)
+    if reminder is None:
+        return
+    
+    embed = discord.Embed(
+        title="⏰ Reminder",
+        description=reminder["reminder"],
+        color=0xFFD700
+    )
+    
+    delivered = False
+    channel = bot.get_channel(reminder["channel_id"])
+    if channel:
+        try:
+            await channel.send(f"<@{reminder['user_id']}>", embed=embed)
+            delivered = True
+        except discord.HTTPException as e:
+            if e.status == 429:
+                # Still rate limited after the library's own retries, try again shortly
+                scheduler.schedule(f"reminder:{reminder_id}", time.time() + 5, "reminder", reminder_id)
+                return
+    
+    if not delivered:
+        # Fall back to a DM when the channel is gone or not writable
+        try:
+            user = bot.get_user(int(reminder["user_id"])) or await bot.fetch_user(int(reminder["user_id"]))
+            await user.send(embed=embed)
+        except:
+            pass
     
-    if "reminders" not in server_settings:
+    # The reminder may have been cancelled while it was being delivered
+    if reminder_store.get(reminder_id) is None:
         return
     
-    for user_id, reminders in server_settings["reminders"].items():
-        due_reminders = []
-        remaining_reminders = []
-        
-        for reminder in reminders:
-            if reminder["remind_time"] <= current_time:
-                due_reminders.append(reminder)
+    if reminder.get("interval"):
+        next_time = reminder["remind_time"] + reminder["interval"]
+        now = time.time()
+        if next_time <= now:
+            # Skip occurrences missed while the bot was offline
+            next_time += ((int(now) - next_time) // reminder["interval"] + 1) * reminder["interval"]
+        reminder_store.reschedule(reminder_id, next_time)
+        scheduler.schedule(f"reminder:{reminder_id}", next_time, "reminder", reminder_id)
+    else:
+        reminder_store.remove(reminder_id)
+
+def load_trade_jobs():
+    return [
+        (f"trade:{trade_id}", trade["expires_at"], trade_id)
+        for trade_id, trade in trades_data.items()
+        if trade["status"] == "pending"
+    ]
+
+async def run_trade_expiry(trade_id: str):
+    trade = trades_data.get(trade_id)
+    if not trade or not await close_trade(trade_id, "expired"):
+        return
+    
+    channel = bot.get_channel(trade["channel_id"])
+    if channel and trade.get("message_id"):
+        try:
+            await channel.get_partial_message(trade["message_id"]).edit(embed=build_trade_embed(trade), view=None)
+        except discord.HTTPException:
+            pass
+
+scheduler.register("giveaway_end", run_giveaway_end, load_giveaway_jobs)
+scheduler.register("reminder", run_reminder, load_reminder_jobs)
+scheduler.register("trade_expire", run_trade_expiry, load_trade_jobs)
+
+@tasks.loop(seconds=GIVEAWAY_LOG_FLUSH_SECONDS)
+async def flush_giveaway_joins():
+    """Append buffered giveaway joins to the participant logs"""
+    giveaway_participants.flush()
+
+@tasks.loop(seconds=AUCTION_SUMMARY_EDIT_SECONDS)
+async def flush_auction_summaries():
+    """Save buffered bids and edit each changed auction's pinned summary once"""
+    global auction_bids_dirty
+    if auction_bids_dirty:
+        auction_bids_dirty = False
+        save_json("auctions.json", auction_data)
+    
+    pending = list(auction_summary_pending)
+    auction_summary_pending.clear()
+    for auction_id in pending:
+        auction = auction_data.get(auction_id)
+        thread = bot.get_channel(auction["thread_id"]) if auction else None
+        if not thread:
+            continue
+        try:
+            embed = build_auction_summary_embed(auction)
+            if auction.get("summary_message_id"):
+                await thread.get_partial_message(auction["summary_message_id"]).edit(embed=embed)
             else:
-                remaining_reminders.append(reminder)
-        
-        if due_reminders:
-            server_settings["reminders"][user_id] = remaining_reminders
-            user = bot.get_user(int(user_id))
-            
-            for reminder in due_reminders:
-                channel = bot.get_channel(reminder["channel_id"])
-                if channel and user:
-                    embed = discord.Embed(
-                        title="⏰ Reminder",
-                        description=reminder["reminder"],
-                        color=0xFFD700
-                    )
-                    await channel.send(f"{user.mention}", embed=embed)
-    
-    # Clean up empty reminder lists
-    server_settings["reminders"] = {k: v for k, v in server_settings["reminders"].items() if v}
-    save_json("server_settings.json", server_settings)
+                summary = await thread.send(embed=embed)
+                auction["summary_message_id"] = summary.id
+                auction_bids_dirty = True
+                await summary.pin()
+        except discord.NotFound:
+            auction.pop("summary_message_id", None)
+            auction_summary_pending.add(auction_id)
+        except discord.HTTPException as e:
+            print(f"Failed to update auction summary {auction_id}: {e}")
+
+@tasks.loop(minutes=ANALYTICS_FLUSH_MINUTES)
+async def flush_analytics():
+    """Persist the in-memory analytics stores"""
+    save_json("activity_history.json", activity_history.to_json())
+    save_json("channel_activity.json", channel_activity.to_json())
+    active_users.save()
+    save_json("trending_terms.json", trending_terms.to_json())
+    ledger.snapshot()
+    if income_accruals_dirty:
+        save_income_accruals()
 
 @tasks.loop(hours=24)
 async def daily_automated_cleanup():
@@ -3574,13 +6135,10 @@ async def daily_automated_cleanup():
     cleaned_items = []
     
     # Clean up old auctions
-    old_auctions = []
-    for auction_id, auction in auction_data.items():
-        if auction["status"] in ["ended", "cancelled"]:
-            old_auctions.append(auction_id)
+    old_auctions = auction_lookup.query(status="ended") + auction_lookup.query(status="cancelled")
     
     for auction_id in old_auctions:
-        del auction_data[auction_id]
+        delete_auction(auction_id)
     
     if old_auctions:
         cleaned_items.append(f"Removed {len(old_auctions)} old auctions")
@@ -3606,11 +6164,24 @@ async def daily_automated_cleanup():
             old_giveaways.append(giveaway_id)
     
     for giveaway_id in old_giveaways:
+        giveaway_message_index.pop(giveaways_data[giveaway_id].get("message_id"), None)
+        giveaway_participants.delete(giveaway_id)
+        giveaway_rules.pop(giveaway_id, None)
+        giveaway_index.remove(giveaway_id)
         del giveaways_data[giveaway_id]
     
     if old_giveaways:
         cleaned_items.append(f"Removed {len(old_giveaways)} old giveaways")
     
+    # Clean up closed trades (older than 30 days)
+    old_trades = [trade_id for trade_id, trade in trades_data.items() if trade["status"] != "pending" and trade["expires_at"] < cutoff_time]
+    for trade_id in old_trades:
+        del trades_data[trade_id]
+    
+    if old_trades:
+        save_json("trades.json", trades_data)
+        cleaned_items.append(f"Removed {len(old_trades)} old trades")
+    
     if cleaned_items:
         save_all()
         print(f"Daily cleanup completed: {', '.join(cleaned_items)}")
@@ -3625,7 +6196,10 @@ async def on_member_update(before, after):
     
     # Check if roles changed
     if before.roles != after.roles:
+        member_role_cache.pop(after.id, None)
         user_id = str(after.id)
+        # Pay out income earned with the old roles, then start accruing with the new ones
+        change_income_roles(user_id, frozenset(role.id for role in before.roles), frozenset(role.id for role in after.roles))
         ensure_user_slots(user_id, after)
         save_json("premium_slots.json", premium_slots)
 
@@ -3656,6 +6230,8 @@ async def on_member_remove(member):
     if member.guild.id != GUILD_ID:
         return
     
+    member_role_cache.pop(member.id, None)
+    
     await log_action("members", f"📤 **Member Left**\n**User:** {member.mention} ({member.id})\n**Roles:** {', '.join([role.name for role in member.roles if role.name != '@everyone'])}")
 
 @bot.event
@@ -3682,16 +6258,60 @@ async def on_voice_state_update(member, before, after):
             # Moved channels
             await log_action("voice", f"🔄 **Moved Voice**\n**User:** {member.mention}\n**From:** {before.channel.mention}\n**To:** {after.channel.mention}")
 
+async def migrate_legacy_views():
+    """Attach the persistent views to messages posted before they had fixed custom_ids"""
+    giveaways_changed = False
+    for giveaway in giveaways_data.values():
+        if giveaway["status"] != "active" or giveaway.get("persistent_view") or not giveaway.get("message_id"):
+            continue
+        # Anything that fails stays unmarked and is retried on the next start
+        try:
+            channel = bot.get_channel(giveaway["channel_id"]) or await bot.fetch_channel(giveaway["channel_id"])
+            await channel.get_partial_message(giveaway["message_id"]).edit(view=GiveawayView())
+        except discord.HTTPException as e:
+            print(f"Failed to migrate giveaway view {giveaway['id']}: {e}")
+            continue
+        giveaway["persistent_view"] = True
+        giveaways_changed = True
+    
+    menus_changed = False
+    for menu_id, menu in server_settings.get("role_menus", {}).items():
+        if menu.get("persistent_view"):
+            continue
+        try:
+            channel = bot.get_channel(menu["channel_id"]) or await bot.fetch_channel(menu["channel_id"])
+            await channel.get_partial_message(menu["message_id"]).edit(view=RoleMenuView())
+        except discord.HTTPException as e:
+            print(f"Failed to migrate role menu view {menu_id}: {e}")
+            continue
+        menu["persistent_view"] = True
+        menus_changed = True
+    
+    if giveaways_changed:
+        save_json("giveaways.json", giveaways_data)
+    if menus_changed:
+        save_json("server_settings.json", server_settings)
+
 @bot.event
 async def on_ready():
     print(f"Logged in as {bot.user} (ID: {bot.user.id})")
+    
+    # One instance of each persistent view serves every giveaway and role menu message
+    bot.add_view(GiveawayView())
+    bot.add_view(RoleMenuView())
+    bot.add_view(TradeView())
+    bot.add_dynamic_items(ShopPageButton)
     await tree.sync(guild=discord.Object(id=GUILD_ID))
     reset_daily.start()
     reset_weekly.start()
     reset_monthly.start()
-    check_giveaways.start()
     daily_automated_cleanup.start()
-    check_reminders.start()
+    scheduler.start()
+    purchase_queue.start()
+    asyncio.create_task(migrate_legacy_views())
+    flush_analytics.start()
+    flush_giveaway_joins.start()
+    flush_auction_summaries.start()
     
     # Update all members' slots on startup
     guild = bot.get_guild(GUILD_ID)
@@ -3702,4 +6322,9 @@ async def on_ready():
                 ensure_user_slots(user_id, member)
         save_json("premium_slots.json", premium_slots)
 
-bot.run(TOKEN)
+if __name__ == "__main__":
+    if not TOKEN:
+        print("Error: DISCORD_BOT_TOKEN environment variable not set!")
+        print("Please set your Discord bot token in the Secrets tab.")
+        exit(1)
+    bot.run(TOKEN)